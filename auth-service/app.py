@@ -1,12 +1,26 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+import os
+import sys
+
+# Módulos compartidos entre servicios (carpeta common/ en la raíz del repositorio)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, EmailStr, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from typing import List
 from models import User, get_db
+from hashing import password_hasher, HashingOverloadedError
+from user_import import IMPORT_FORMATS, IMPORT_BATCH_SIZE, iter_records, iter_batches
+from user_cache import user_cache, user_to_dict
+from login_throttle import login_throttle
 import uvicorn
+import hmac
 
 app = FastAPI(title="Auth Service", version="1.0.0")
 
@@ -19,11 +33,34 @@ app.add_middleware(
 )
 
 # Configuración de seguridad
-SECRET_KEY = "flight-reservation-secret-key-2025"
+SECRET_KEY = os.getenv("JWT_SECRET_KEY", "flight-reservation-secret-key-2025")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 horas
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Identificador de la llave activa (va en el header "kid" de cada token)
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "2025-01")
+# Llaves anteriores que se siguen aceptando durante una rotación: "kid1:secreto1,kid2:secreto2"
+JWT_PREVIOUS_KEYS = os.getenv("JWT_PREVIOUS_KEYS", "")
+# Cada cuánto deben volver a pedir las llaves los demás servicios (segundos)
+JWT_KEYS_MAX_AGE = int(os.getenv("JWT_KEYS_MAX_AGE", "300"))
+# Token compartido entre microservicios para endpoints internos; sin él, /auth/keys queda deshabilitado
+INTERNAL_SERVICE_TOKEN = os.getenv("INTERNAL_SERVICE_TOKEN", "")
+# Máximo de tokens por llamada a /auth/verify/batch
+MAX_BATCH_TOKENS = int(os.getenv("MAX_BATCH_TOKENS", "1000"))
+# Máximo de ids por llamada a GET /auth/users
+MAX_USER_IDS = int(os.getenv("MAX_USER_IDS", "500"))
+
+def load_signing_keys():
+    """Arma el llavero kid -> secreto con la llave activa y las anteriores"""
+    keys = {JWT_ACTIVE_KID: SECRET_KEY}
+    for entry in JWT_PREVIOUS_KEYS.split(","):
+        if ":" not in entry:
+            continue
+        kid, secret = entry.split(":", 1)
+        keys.setdefault(kid.strip(), secret.strip())
+    return keys
+
+SIGNING_KEYS = load_signing_keys()
 
 # Modelos Pydantic
 class UserRegister(BaseModel):
@@ -42,6 +79,9 @@ class Token(BaseModel):
     user_id: int
     role: str
 
+class TokenBatchRequest(BaseModel):
+    tokens: List[str]
+
 class UserResponse(BaseModel):
     id: int
     email: str
@@ -50,19 +90,73 @@ class UserResponse(BaseModel):
     created_at: datetime
 
 # Funciones auxiliares
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# El hash corre en un pool de procesos para no bloquear el resto del servicio
+def hashing_overloaded():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Servicio saturado, intente de nuevo",
+        headers={"Retry-After": "1"},
+    )
+
+async def verify_password(plain_password, hashed_password):
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except HashingOverloadedError:
+        raise hashing_overloaded()
+
+async def get_password_hash(password):
+    try:
+        return await password_hasher.hash(password)
+    except HashingOverloadedError:
+        raise hashing_overloaded()
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hashes(passwords):
+    try:
+        return await password_hasher.hash_many(passwords)
+    except HashingOverloadedError:
+        raise hashing_overloaded()
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(
+        to_encode, SECRET_KEY, algorithm=ALGORITHM, headers={"kid": JWT_ACTIVE_KID}
+    )
     return encoded_jwt
 
+def decode_access_token(token: str):
+    """Valida firma y expiración usando la llave indicada por el "kid" del token"""
+    header = jwt.get_unverified_header(token)
+    # Los tokens emitidos antes de la rotación no traen "kid"
+    key = SIGNING_KEYS.get(header.get("kid", JWT_ACTIVE_KID))
+    if key is None:
+        raise JWTError("Llave de firma desconocida")
+    return jwt.decode(token, key, algorithms=[ALGORITHM])
+
+def require_admin(authorization: str = Header(None)):
+    if not authorization:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token no proporcionado"
+        )
+    
+    try:
+        payload = decode_access_token(authorization.replace("Bearer ", ""))
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+    
+    if payload.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso restringido a administradores"
+        )
+    
+    return payload
+
 # Endpoints
 @app.get("/")
 def root():
@@ -70,13 +164,28 @@ def root():
         "service": "Auth Service",
         "version": "1.0.0",
         "status": "running",
-        "endpoints": ["/auth/register", "/auth/login", "/auth/verify"]
+        "endpoints": ["/auth/register", "/auth/login", "/auth/verify", "/auth/verify/batch", "/auth/keys", "/auth/users", "/auth/users/import"]
+    }
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "password_hashing": password_hasher.stats(),
+        "user_cache": user_cache.stats(),
+        "login_throttle": login_throttle.stats()
     }
 
+@app.on_event("shutdown")
+def shutdown_hasher():
+    password_hasher.shutdown()
+
 @app.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserRegister, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     # Validador de Usuarios
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    # Las consultas van al threadpool porque este endpoint es async
+    existing_user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.email == user_data.email).first()
+    )
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -91,7 +200,7 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         )
     
     # Crear nuevo usuario
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     new_user = User(
         email=user_data.email,
         password_hash=hashed_password,
@@ -99,23 +208,41 @@ def register(user_data: UserRegister, db: Session = Depends(get_db)):
         role=user_data.role
     )
     
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    def save_user():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+    
+    await run_in_threadpool(save_user)
     
     return new_user
 
 @app.post("/auth/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, request: Request, db: Session = Depends(get_db)):
+    # Rechazar antes de tocar la base de datos o calcular el hash
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = await login_throttle.check(credentials.email, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos fallidos, intente más tarde",
+            headers={"Retry-After": str(retry_after)},
+        )
+    
     # Buscar usuario
-    user = db.query(User).filter(User.email == credentials.email).first()
-    if not user or not verify_password(credentials.password, user.password_hash):
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.email == credentials.email).first()
+    )
+    if not user or not await verify_password(credentials.password, user.password_hash):
+        await login_throttle.record_failure(credentials.email, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    await login_throttle.record_success(credentials.email)
+    
     # Crear token para mas placer
     access_token = create_access_token(
         data={"sub": str(user.id), "role": user.role, "email": user.email}
@@ -131,7 +258,7 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
 @app.get("/auth/verify")
 def verify_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         user_id = payload.get("sub")
         role = payload.get("role")
         email = payload.get("email")
@@ -154,9 +281,189 @@ def verify_token(token: str):
             detail="Token inválido o expirado"
         )
 
+@app.post("/auth/verify/batch")
+def verify_tokens_batch(batch: TokenBatchRequest):
+    if len(batch.tokens) > MAX_BATCH_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {MAX_BATCH_TOKENS} tokens por lote"
+        )
+    
+    # Un resultado por token, en el mismo orden en que llegaron
+    results = []
+    for token in batch.tokens:
+        try:
+            payload = decode_access_token(token)
+            user_id = payload.get("sub")
+            if user_id is None:
+                results.append({"valid": False, "error": "Token inválido"})
+                continue
+            
+            results.append({
+                "valid": True,
+                "user_id": int(user_id),
+                "role": payload.get("role"),
+                "email": payload.get("email")
+            })
+        except (JWTError, ValueError):
+            results.append({"valid": False, "error": "Token inválido o expirado"})
+    
+    return {"results": results}
+
+@app.get("/auth/keys")
+def get_signing_keys(x_internal_token: str = Header(None)):
+    # Sin token configurado no se publica el material de llaves
+    if not INTERNAL_SERVICE_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="INTERNAL_SERVICE_TOKEN no está configurado"
+        )
+    # Solo los demás microservicios pueden descargar el material de llaves
+    if not hmac.compare_digest((x_internal_token or "").encode(), INTERNAL_SERVICE_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso restringido a servicios internos"
+        )
+    
+    return {
+        "algorithm": ALGORITHM,
+        "active_kid": JWT_ACTIVE_KID,
+        "keys": SIGNING_KEYS,
+        "max_age": JWT_KEYS_MAX_AGE
+    }
+
+@app.post("/auth/users/import")
+async def import_users(
+    request: Request,
+    file_format: str = Query("ndjson", alias="format"),
+    db: Session = Depends(get_db),
+    admin_data: dict = Depends(require_admin)
+):
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Formato inválido. Use: {', '.join(IMPORT_FORMATS)}"
+        )
+    
+    results = []
+    created = 0
+    seen_emails = set()
+    
+    async for batch in iter_batches(iter_records(request.stream(), file_format), IMPORT_BATCH_SIZE):
+        # Validar cada fila y descartar emails repetidos dentro del archivo
+        candidates = []
+        for row, record, error in batch:
+            if error:
+                results.append({"row": row, "status": "error", "error": error})
+                continue
+            
+            try:
+                user_data = UserRegister(**record)
+            except ValidationError as e:
+                field = ".".join(str(part) for part in e.errors()[0]["loc"])
+                results.append({"row": row, "status": "error", "error": f"Campo inválido: {field}"})
+                continue
+            
+            if user_data.role not in ["customer", "airline", "admin"]:
+                results.append({"row": row, "status": "error", "error": "Rol inválido"})
+                continue
+            
+            if user_data.email in seen_emails:
+                results.append({"row": row, "status": "error", "error": "Email repetido en el archivo"})
+                continue
+            
+            seen_emails.add(user_data.email)
+            candidates.append((row, user_data))
+        
+        if not candidates:
+            continue
+        
+        # Una sola consulta para todos los emails del lote
+        emails = [user_data.email for _, user_data in candidates]
+        existing = await run_in_threadpool(
+            lambda: {email for (email,) in db.query(User.email).filter(User.email.in_(emails))}
+        )
+        
+        pending = []
+        for row, user_data in candidates:
+            if user_data.email in existing:
+                results.append({"row": row, "status": "error", "error": "El email ya está registrado"})
+            else:
+                pending.append((row, user_data))
+        
+        if not pending:
+            continue
+        
+        hashes = await get_password_hashes([user_data.password for _, user_data in pending])
+        rows = [
+            {
+                "email": user_data.email,
+                "password_hash": hashed_password,
+                "full_name": user_data.full_name,
+                "role": user_data.role
+            }
+            for (_, user_data), hashed_password in zip(pending, hashes)
+        ]
+        
+        # Un solo INSERT multi-fila (executemany) y un commit por lote
+        def insert_batch():
+            try:
+                inserted = db.execute(insert(User).returning(User.id, User.email), rows).all()
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return None
+            return {email: user_id for user_id, email in inserted}
+        
+        inserted_ids = await run_in_threadpool(insert_batch)
+        for row, user_data in pending:
+            if inserted_ids is None:
+                # Otro proceso registró alguno de estos emails mientras importábamos
+                results.append({"row": row, "status": "error", "error": "Conflicto al insertar el lote, reintente"})
+            else:
+                created += 1
+                results.append({"row": row, "status": "created", "id": inserted_ids[user_data.email]})
+    
+    results.sort(key=lambda result: result["row"])
+    return {
+        "total": len(results),
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
+
+def load_users(db: Session, user_ids):
+    """Busca perfiles en la caché y trae los que falten con una sola consulta IN"""
+    found, missing = user_cache.get_many(user_ids)
+    if missing:
+        loaded = [user_to_dict(user) for user in db.query(User).filter(User.id.in_(missing))]
+        user_cache.put_many(loaded)
+        found.update((profile["id"], profile) for profile in loaded)
+    return found
+
+@app.get("/auth/users", response_model=List[UserResponse])
+def get_users(ids: str, db: Session = Depends(get_db)):
+    try:
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in ids.split(",") if user_id.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids debe ser una lista de enteros separados por coma"
+        )
+    
+    if len(user_ids) > MAX_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {MAX_USER_IDS} ids por consulta"
+        )
+    
+    # Se respeta el orden pedido; los ids inexistentes se omiten
+    users = load_users(db, user_ids)
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
 @app.get("/auth/users/{user_id}", response_model=UserResponse)
 def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = load_users(db, [user_id]).get(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,120 @@
+"""
+Hash y verificación de contraseñas (pbkdf2_sha256) en un pool de procesos.
+
+pbkdf2 consume CPU y retiene el GIL, así que correrlo dentro de los endpoints
+bloquea al resto del servicio. Aquí se ejecuta en un ProcessPoolExecutor con
+un tope de trabajos simultáneos; las peticiones que no consiguen lugar en
+HASH_QUEUE_TIMEOUT segundos se rechazan con HashingOverloadedError.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
+import threading
+
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+
+# 0 trabajadores = hash en el threadpool del proceso (útil en desarrollo)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+# Máximo de trabajos enviados al pool a la vez (corriendo + en cola del pool)
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", str(max(HASH_WORKERS, 1) * 4)))
+# Segundos que una petición espera un lugar antes de ser rechazada
+HASH_QUEUE_TIMEOUT = float(os.getenv("HASH_QUEUE_TIMEOUT", "5"))
+
+
+class HashingOverloadedError(Exception):
+    """Demasiadas operaciones de hash pendientes"""
+
+
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _hash_passwords(passwords):
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int, queue_timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._semaphore = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # El pool se crea al primer uso para no forkear al importar el módulo
+        if self.workers <= 0:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    async def _run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HashingOverloadedError("Demasiadas operaciones de hash pendientes")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash_password, password)
+
+    async def hash_many(self, passwords):
+        """Reparte una lista de contraseñas entre los procesos del pool"""
+        if not passwords:
+            return []
+        parts = max(self.workers, 1)
+        size = -(-len(passwords) // parts)
+        chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        hashed = await asyncio.gather(*(self._run(_hash_passwords, chunk) for chunk in chunks))
+        return [h for chunk in hashed for h in chunk]
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify_password, plain_password, hashed_password)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher(HASH_WORKERS, HASH_MAX_PENDING, HASH_QUEUE_TIMEOUT)
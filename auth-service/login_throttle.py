@@ -0,0 +1,188 @@
+"""
+Limitador de intentos fallidos de login por email y por IP.
+
+Usa una ventana deslizante aproximada (ventana actual + ventana anterior
+ponderada), que solo necesita dos contadores por llave. Cuando una llave
+supera su límite, /auth/login responde 429 antes de consultar la base de
+datos o calcular pbkdf2.
+
+Por defecto los contadores viven en memoria (por proceso). Con
+LOGIN_THROTTLE_REDIS_URL se comparten entre instancias vía Redis (requiere el
+paquete opcional "redis"); se usa el cliente async para no bloquear el event
+loop de /auth/login en cada consulta.
+"""
+
+from collections import OrderedDict
+import math
+import os
+import sys
+import threading
+import time
+
+LOGIN_THROTTLE_WINDOW = int(os.getenv("LOGIN_THROTTLE_WINDOW", "300"))  # segundos
+LOGIN_THROTTLE_EMAIL_LIMIT = int(os.getenv("LOGIN_THROTTLE_EMAIL_LIMIT", "5"))
+LOGIN_THROTTLE_IP_LIMIT = int(os.getenv("LOGIN_THROTTLE_IP_LIMIT", "50"))
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+LOGIN_THROTTLE_REDIS_URL = os.getenv("LOGIN_THROTTLE_REDIS_URL")
+
+
+class MemoryCounterStore:
+    """Contadores por ventana en memoria, con tope de llaves (LRU)"""
+
+    backend = "memory"
+
+    def __init__(self, window: int, max_keys: int):
+        self.window = window
+        self.max_keys = max_keys
+        self._counters = OrderedDict()  # llave -> [índice_ventana, actual, anterior]
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _roll(self, entry, window_index):
+        if entry[0] == window_index:
+            return
+        # Si pasó más de una ventana, la anterior también quedó vacía
+        entry[2] = entry[1] if entry[0] == window_index - 1 else 0
+        entry[1] = 0
+        entry[0] = window_index
+
+    async def counts(self, key, window_index):
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None:
+                return 0, 0
+            self._roll(entry, window_index)
+            return entry[1], entry[2]
+
+    async def increment(self, key, window_index):
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None:
+                entry = self._counters[key] = [window_index, 0, 0]
+            self._roll(entry, window_index)
+            entry[1] += 1
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+                self.evictions += 1
+
+    async def reset(self, key):
+        with self._lock:
+            self._counters.pop(key, None)
+
+    async def purge(self, window_index):
+        """Elimina llaves sin intentos en las dos últimas ventanas"""
+        with self._lock:
+            stale = [key for key, entry in self._counters.items() if entry[0] < window_index - 1]
+            for key in stale:
+                del self._counters[key]
+
+    def stats(self):
+        with self._lock:
+            memory = sys.getsizeof(self._counters) + sum(
+                sys.getsizeof(key) + sys.getsizeof(entry) for key, entry in self._counters.items()
+            )
+            return {
+                "backend": self.backend,
+                "tracked_keys": len(self._counters),
+                "max_keys": self.max_keys,
+                "evictions": self.evictions,
+                "approx_memory_bytes": memory,
+            }
+
+
+class RedisCounterStore:
+    """Contadores compartidos entre instancias; cada ventana expira sola en Redis"""
+
+    backend = "redis"
+
+    def __init__(self, url: str, window: int):
+        import redis.asyncio
+
+        self.window = window
+        self._redis = redis.asyncio.Redis.from_url(url)
+
+    async def counts(self, key, window_index):
+        current, previous = await self._redis.mget(
+            f"login_throttle:{key}:{window_index}",
+            f"login_throttle:{key}:{window_index - 1}",
+        )
+        return int(current or 0), int(previous or 0)
+
+    async def increment(self, key, window_index):
+        redis_key = f"login_throttle:{key}:{window_index}"
+        pipeline = self._redis.pipeline()
+        pipeline.incr(redis_key)
+        pipeline.expire(redis_key, self.window * 2)
+        await pipeline.execute()
+
+    async def reset(self, key):
+        window_index = int(time.time() // self.window)
+        await self._redis.delete(
+            f"login_throttle:{key}:{window_index}",
+            f"login_throttle:{key}:{window_index - 1}",
+        )
+
+    async def purge(self, window_index):
+        pass
+
+    def stats(self):
+        return {"backend": self.backend}
+
+
+class LoginThrottle:
+    def __init__(self, store, window: int, email_limit: int, ip_limit: int):
+        self.store = store
+        self.window = window
+        self.limits = {"email": email_limit, "ip": ip_limit}
+        self.blocked = 0
+        self.failures = 0
+        self._last_purge = 0
+
+    async def _estimate(self, key, now):
+        window_index = int(now // self.window)
+        current, previous = await self.store.counts(key, window_index)
+        elapsed = (now % self.window) / self.window
+        return previous * (1 - elapsed) + current
+
+    async def check(self, email: str, client_ip: str) -> int:
+        """Devuelve 0 si se permite el intento, o los segundos a esperar"""
+        now = time.time()
+        for kind, value in (("email", email.lower()), ("ip", client_ip)):
+            if await self._estimate(f"{kind}:{value}", now) >= self.limits[kind]:
+                self.blocked += 1
+                return max(1, math.ceil(self.window - now % self.window))
+        return 0
+
+    async def record_failure(self, email: str, client_ip: str):
+        now = time.time()
+        window_index = int(now // self.window)
+        self.failures += 1
+        await self.store.increment(f"email:{email.lower()}", window_index)
+        await self.store.increment(f"ip:{client_ip}", window_index)
+        if window_index != self._last_purge:
+            self._last_purge = window_index
+            await self.store.purge(window_index)
+
+    async def record_success(self, email: str):
+        await self.store.reset(f"email:{email.lower()}")
+
+    def stats(self):
+        return {
+            "window_seconds": self.window,
+            "email_limit": self.limits["email"],
+            "ip_limit": self.limits["ip"],
+            "failures": self.failures,
+            "blocked": self.blocked,
+            **self.store.stats(),
+        }
+
+
+if LOGIN_THROTTLE_REDIS_URL:
+    _store = RedisCounterStore(LOGIN_THROTTLE_REDIS_URL, LOGIN_THROTTLE_WINDOW)
+else:
+    _store = MemoryCounterStore(LOGIN_THROTTLE_WINDOW, LOGIN_THROTTLE_MAX_KEYS)
+
+login_throttle = LoginThrottle(
+    _store, LOGIN_THROTTLE_WINDOW, LOGIN_THROTTLE_EMAIL_LIMIT, LOGIN_THROTTLE_IP_LIMIT
+)
@@ -0,0 +1,80 @@
+"""
+Caché read-through de perfiles de usuario.
+
+LRU acotada por tamaño; cada entrada vive como máximo USER_CACHE_TTL segundos.
+Ningún endpoint modifica usuarios existentes, así que no hay invalidación
+explícita: un cambio hecho directo en la base (o por otra instancia) puede
+verse desactualizado hasta USER_CACHE_TTL segundos.
+"""
+
+from collections import OrderedDict
+import os
+import threading
+import time
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+
+def user_to_dict(user):
+    return {
+        "id": user.id,
+        "email": user.email,
+        "full_name": user.full_name,
+        "role": user.role,
+        "created_at": user.created_at,
+    }
+
+
+class UserCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expira_en, perfil)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, user_ids):
+        """Devuelve ({id: perfil} encontrados, [ids que faltan])"""
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is None or entry[0] <= now:
+                    self._entries.pop(user_id, None)
+                    self.misses += 1
+                    missing.append(user_id)
+                    continue
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                found[user_id] = entry[1]
+        return found, missing
+
+    def put_many(self, profiles):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for profile in profiles:
+                self._entries[profile["id"]] = (expires_at, profile)
+                self._entries.move_to_end(profile["id"])
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
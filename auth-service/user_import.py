@@ -0,0 +1,12 @@
+"""
+Importación masiva de usuarios (NDJSON o CSV).
+
+La lectura en streaming y el armado de lotes están en common/streaming_import.py;
+aquí solo queda el tamaño de lote propio de este servicio.
+"""
+
+import os
+
+from common.streaming_import import IMPORT_FORMATS, iter_records, iter_batches
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
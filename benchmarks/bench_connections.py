@@ -0,0 +1,73 @@
+"""
+Benchmark - Búsqueda de itinerarios con escalas sobre una red sintética
+Construye en memoria una red de aeropuertos con hubs y mide la carga del
+grafo y el tiempo de búsqueda con 0, 1 y 2 escalas. No requiere servicios
+ni base de datos.
+
+Uso: python benchmarks/bench_connections.py [aeropuertos] [vuelos_por_día] [días]
+"""
+
+from datetime import datetime, timedelta, date
+from types import SimpleNamespace
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "flights-service"))
+
+from connections import ConnectionGraph
+
+def synthetic_flights(airports, flights_per_day, days, seed=42):
+    rng = random.Random(seed)
+    codes = [f"A{i:03d}" for i in range(airports)]
+    hubs = codes[:max(airports // 20, 1)]
+    start = datetime(2030, 1, 1)
+    flight_id = 0
+    for day in range(days):
+        for _ in range(flights_per_day):
+            flight_id += 1
+            # La mitad de los vuelos entra o sale de un hub
+            origin = rng.choice(hubs if rng.random() < 0.5 else codes)
+            destination = rng.choice(codes)
+            while destination == origin:
+                destination = rng.choice(codes)
+            departure = start + timedelta(days=day, minutes=rng.randrange(24 * 60))
+            yield SimpleNamespace(
+                id=flight_id,
+                flight_number=f"SYN{flight_id}",
+                origin=origin,
+                destination=destination,
+                departure_time=departure,
+                arrival_time=departure + timedelta(minutes=rng.randrange(60, 600)),
+                price=rng.randrange(50, 900),
+                available_seats=rng.randrange(0, 180),
+                total_seats=180,
+                airline_id=1,
+                created_at=start,
+            )
+
+def main():
+    airports = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+
+    flights = list(synthetic_flights(airports, per_day, days))
+    graph = ConnectionGraph()
+    start = time.perf_counter()
+    graph.load(flights)
+    print(f"Grafo: {len(flights):,} vuelos, {airports} aeropuertos, carga {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(7)
+    pairs = [(f"A{rng.randrange(airports):03d}", f"A{rng.randrange(airports):03d}") for _ in range(50)]
+    pairs = [(o, d) for o, d in pairs if o != d]
+    for max_stops in (0, 1, 2):
+        found = 0
+        start = time.perf_counter()
+        for origin, destination in pairs:
+            found += len(graph.search(origin, destination, date(2030, 1, 3), max_stops=max_stops))
+        elapsed = time.perf_counter() - start
+        print(f"Escalas <= {max_stops}: {elapsed / len(pairs) * 1000:.2f} ms/búsqueda, {found} itinerarios")
+
+if __name__ == "__main__":
+    main()
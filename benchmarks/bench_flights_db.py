@@ -0,0 +1,86 @@
+"""
+Benchmark - Lecturas de Flights Service en modo sync vs. async
+Lanza peticiones concurrentes a GET /flights/search (búsqueda por origen y
+fecha, que siempre va a la base de datos) y GET /flights/{id}, y reporta
+throughput y latencias p50/p99 de cada endpoint.
+
+Para comparar ambos modos se corre dos veces contra el servicio levantado
+con la caché de búsquedas apagada, una por modo:
+
+    SEARCH_CACHE_SIZE=0 DB_ASYNC=false python app.py
+    SEARCH_CACHE_SIZE=0 DB_ASYNC=true python app.py
+
+Requiere Flights Service corriendo en http://localhost:8002 con vuelos cargados
+(por ejemplo con POST /flights/import).
+Uso: python benchmarks/bench_flights_db.py [peticiones] [concurrencia]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import random
+import sys
+import threading
+import time
+import requests
+
+FLIGHTS_URL = "http://localhost:8002"
+
+local = threading.local()
+
+def get_session():
+    # Una sesión por hilo para reutilizar conexiones sin compartirlas
+    if not hasattr(local, "session"):
+        local.session = requests.Session()
+    return local.session
+
+def load_sample():
+    response = requests.get(f"{FLIGHTS_URL}/flights/search", params={"limit": 500})
+    response.raise_for_status()
+    flights = response.json()
+    if not flights:
+        sys.exit("No hay vuelos con cupo; importe vuelos antes de correr el benchmark")
+    return flights
+
+def timed_get(path, params=None):
+    start = time.perf_counter()
+    response = get_session().get(f"{FLIGHTS_URL}{path}", params=params)
+    elapsed = time.perf_counter() - start
+    return elapsed, response.status_code
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+def run(name, requests_total, concurrency, make_request):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: make_request(), range(requests_total)))
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed * 1000 for elapsed, _ in results]
+    errors = sum(1 for _, code in results if code != 200)
+    print(f"{name}: {requests_total / wall:,.0f} req/s, "
+          f"p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms, "
+          f"errores {errors}")
+
+def main():
+    requests_total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    flights = load_sample()
+    ids = [flight["id"] for flight in flights]
+    searches = list({(flight["origin"], flight["departure_time"][:10]) for flight in flights})
+    rng = random.Random(42)
+
+    def search():
+        origin, day = rng.choice(searches)
+        return timed_get("/flights/search", {"origin": origin, "date": day, "limit": 50})
+
+    def by_id():
+        return timed_get(f"/flights/{rng.choice(ids)}")
+
+    print(f"Peticiones: {requests_total}, concurrencia: {concurrency}")
+    run("GET /flights/search", requests_total, concurrency, search)
+    run("GET /flights/{id}  ", requests_total, concurrency, by_id)
+
+if __name__ == "__main__":
+    main()
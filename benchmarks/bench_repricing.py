@@ -0,0 +1,47 @@
+"""
+Benchmark - Cálculo del reajuste masivo de precios
+Genera N filas sintéticas (id, precio, asientos libres, asientos totales,
+salida) como las devuelve la base de datos y mide el paso a arreglos
+columnares y el cálculo vectorizado de los nuevos precios. No requiere
+servicios ni base de datos.
+
+Uso: python benchmarks/bench_repricing.py [vuelos]
+"""
+
+from datetime import datetime, timedelta
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "flights-service"))
+
+from repricing import rows_to_columns, compute_prices
+
+def synthetic_rows(n, now, seed=42):
+    rng = random.Random(seed)
+    return [
+        (i, rng.randrange(50, 900), rng.randrange(0, 181), 180, now + timedelta(minutes=rng.randrange(1, 90 * 24 * 60)))
+        for i in range(1, n + 1)
+    ]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    now = datetime.utcnow()
+    rows = synthetic_rows(n, now)
+
+    start = time.perf_counter()
+    columns = rows_to_columns(rows)
+    to_columns = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_prices = compute_prices(columns, now)
+    compute = time.perf_counter() - start
+
+    changed = int((new_prices != columns["price"]).sum())
+    print(f"Vuelos: {n:,}, con precio nuevo: {changed:,}")
+    print(f"Filas a columnas: {to_columns:.3f}s")
+    print(f"Cálculo vectorizado: {compute:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark - Verificación de tokens individual vs. por lote
+Compara N llamadas a GET /auth/verify contra una sola llamada a
+POST /auth/verify/batch con los mismos N tokens.
+
+Requiere Auth Service corriendo en http://localhost:8001
+Uso: python benchmarks/bench_verify_batch.py [N]
+"""
+
+import sys
+import time
+import requests
+
+AUTH_URL = "http://localhost:8001"
+
+BENCH_USER = {
+    "email": "benchmark@ivoneairlines.com",
+    "password": "benchmark123",
+    "full_name": "Usuario Benchmark",
+    "role": "customer"
+}
+
+def get_token(session):
+    # El registro falla si el usuario ya existe, no importa
+    session.post(f"{AUTH_URL}/auth/register", json=BENCH_USER)
+    response = session.post(
+        f"{AUTH_URL}/auth/login",
+        json={"email": BENCH_USER["email"], "password": BENCH_USER["password"]}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def bench_single(session, tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        session.get(f"{AUTH_URL}/auth/verify", params={"token": token})
+    return time.perf_counter() - start
+
+def bench_batch(session, tokens, batch_size=1000):
+    start = time.perf_counter()
+    for i in range(0, len(tokens), batch_size):
+        response = session.post(
+            f"{AUTH_URL}/auth/verify/batch",
+            json={"tokens": tokens[i:i + batch_size]}
+        )
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    session = requests.Session()
+    token = get_token(session)
+    # Uno de cada diez tokens es inválido para medir también el camino de error
+    tokens = [token if i % 10 else token[:-4] + "abcd" for i in range(n)]
+
+    single = bench_single(session, tokens)
+    batch = bench_batch(session, tokens)
+
+    print(f"Tokens verificados: {n}")
+    print(f"Individual: {single:.3f}s ({n / single:,.0f} tokens/s)")
+    print(f"Por lote:   {batch:.3f}s ({n / batch:,.0f} tokens/s)")
+    print(f"Mejora:     x{single / batch:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Prueba de carga - Reservas concurrentes en Bookings Service
+Crea un vuelo con un asiento por reserva y lanza POST /bookings concurrentes,
+cada una por un asiento distinto. Reporta reservas por segundo y latencias
+p50/p99 por cada instancia de Bookings Service indicada, con un vuelo nuevo
+para cada una.
+
+Para comparar la versión async con la sync anterior, levantar la versión
+anterior en otro puerto y pasar ambas URLs:
+
+    git worktree add /tmp/bookings-sync <commit anterior>
+    cd /tmp/bookings-sync/bookings-service && uvicorn app:app --port 8013
+    python benchmarks/load_bookings.py 600 64 http://localhost:8013 http://localhost:8003
+
+Requiere Auth Service, Flights Service y Bookings Service corriendo.
+Uso: python benchmarks/load_bookings.py [reservas] [concurrencia] [url_bookings ...]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import sys
+import threading
+import time
+import requests
+
+AUTH_URL = "http://localhost:8001"
+FLIGHTS_URL = "http://localhost:8002"
+BOOKINGS_URL = "http://localhost:8003"
+
+SEAT_COLUMNS = "ABCDEF"
+
+AIRLINE_USER = {
+    "email": "load-airline@ivoneairlines.com",
+    "password": "load123",
+    "full_name": "Aerolínea Carga",
+    "role": "airline"
+}
+
+CUSTOMER_USER = {
+    "email": "load-customer@ivoneairlines.com",
+    "password": "load123",
+    "full_name": "Cliente Carga",
+    "role": "customer"
+}
+
+local = threading.local()
+
+def login(user):
+    # El registro falla si el usuario ya existe, no importa
+    requests.post(f"{AUTH_URL}/auth/register", json=user)
+    response = requests.post(
+        f"{AUTH_URL}/auth/login",
+        json={"email": user["email"], "password": user["password"]}
+    )
+    response.raise_for_status()
+    return response.json()
+
+def create_flight(airline, seats):
+    departure = datetime.utcnow() + timedelta(days=30)
+    response = requests.post(
+        f"{FLIGHTS_URL}/flights",
+        headers={"Authorization": f"Bearer {airline['access_token']}"},
+        json={
+            "flight_number": "LOAD",
+            "origin": "BOG",
+            "destination": "MIA",
+            "departure_time": departure.isoformat(),
+            "arrival_time": (departure + timedelta(hours=5)).isoformat(),
+            "price": 100,
+            "total_seats": seats,
+            "airline_id": airline["user_id"]
+        }
+    )
+    response.raise_for_status()
+    return response.json()["id"]
+
+def seat_name(index):
+    return f"{index // len(SEAT_COLUMNS) + 1}{SEAT_COLUMNS[index % len(SEAT_COLUMNS)]}"
+
+def book(bookings_url, customer, flight_id, index):
+    if not hasattr(local, "session"):
+        local.session = requests.Session()
+    start = time.perf_counter()
+    response = local.session.post(
+        f"{bookings_url}/bookings",
+        headers={"Authorization": f"Bearer {customer['access_token']}"},
+        json={
+            "flight_id": flight_id,
+            "user_id": customer["user_id"],
+            "passenger_name": f"Pasajero {index}",
+            "passenger_document": str(100000 + index),
+            "seat_number": seat_name(index)
+        }
+    )
+    return time.perf_counter() - start, response.status_code
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+def run(bookings_url, airline, customer, total, concurrency):
+    flight_id = create_flight(airline, total)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda i: book(bookings_url, customer, flight_id, i), range(total)))
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed * 1000 for elapsed, _ in results]
+    created = sum(1 for _, code in results if code == 201)
+    print(f"{bookings_url}: {created}/{total} reservas, {total / wall:,.0f} reservas/s, "
+          f"p50 {percentile(latencies, 50):.0f} ms, p99 {percentile(latencies, 99):.0f} ms")
+    return total / wall
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    urls = sys.argv[3:] or [BOOKINGS_URL]
+
+    airline = login(AIRLINE_USER)
+    customer = login(CUSTOMER_USER)
+    print(f"Reservas: {total}, concurrencia: {concurrency}")
+    rates = [run(url, airline, customer, total, concurrency) for url in urls]
+    if len(rates) > 1:
+        print(f"Throughput de {urls[-1]}: x{rates[-1] / rates[0]:.2f} respecto a {urls[0]}")
+
+if __name__ == "__main__":
+    main()
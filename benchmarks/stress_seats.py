@@ -0,0 +1,209 @@
+"""
+Prueba de estrés - Reserva concurrente de asientos en un vuelo
+Crea un vuelo con pocos asientos y lanza muchas llamadas simultáneas a
+POST /flights/{id}/seatmap/claim, igual que Bookings Service al reservar: cada
+llamada pide un asiento concreto y cada asiento se pide varias veces. Verifica
+que el número de reservas exitosas sea exactamente el de asientos (sin
+sobreventa), que el vuelo quede en 0 y que el mapa quede lleno.
+
+Se corre dos veces: con mapa y cupo en las filas del vuelo y con ambos
+repartidos en shards por bloques de filas (POST /flights/{id}/seats/shards),
+y compara el throughput.
+
+Después agota dos vuelos con shards en una ruta propia, uno próximo y uno que
+ya salió, y verifica que ninguna lectura los vea con cupo: búsqueda (normal y
+streaming), calendario de tarifas y, tras archivar el que salió, el archivo.
+
+Requiere Auth Service y Flights Service corriendo, y INTERNAL_SERVICE_TOKEN
+con el mismo valor que usa Flights Service.
+Uso: python benchmarks/stress_seats.py [asientos] [peticiones] [hilos] [shards]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import sys
+import time
+import uuid
+import requests
+
+AUTH_URL = "http://localhost:8001"
+FLIGHTS_URL = "http://localhost:8002"
+INTERNAL_SERVICE_TOKEN = os.getenv("INTERNAL_SERVICE_TOKEN", "")
+
+AIRLINE_USER = {
+    "email": "stress-airline@ivoneairlines.com",
+    "password": "stress123",
+    "full_name": "Aerolínea Estrés",
+    "role": "airline"
+}
+
+ADMIN_USER = {
+    "email": "stress-admin@ivoneairlines.com",
+    "password": "stress123",
+    "full_name": "Administrador Estrés",
+    "role": "admin"
+}
+
+def get_token(user):
+    # El registro falla si el usuario ya existe, no importa
+    requests.post(f"{AUTH_URL}/auth/register", json=user)
+    response = requests.post(
+        f"{AUTH_URL}/auth/login",
+        json={"email": user["email"], "password": user["password"]}
+    )
+    response.raise_for_status()
+    return response.json()
+
+def create_hot_flight(login, seats, origin="BOG", destination="MIA", departure=None):
+    departure = departure or datetime.utcnow() + timedelta(days=30)
+    response = requests.post(
+        f"{FLIGHTS_URL}/flights",
+        headers={"Authorization": f"Bearer {login['access_token']}"},
+        json={
+            "flight_number": "STRESS",
+            "origin": origin,
+            "destination": destination,
+            "departure_time": departure.isoformat(),
+            "arrival_time": (departure + timedelta(hours=5)).isoformat(),
+            "price": 100,
+            "total_seats": seats,
+            "airline_id": login["user_id"]
+        }
+    )
+    response.raise_for_status()
+    return response.json()["id"]
+
+def enable_shards(login, flight_id, shards):
+    response = requests.post(
+        f"{FLIGHTS_URL}/flights/{flight_id}/seats/shards",
+        headers={"Authorization": f"Bearer {login['access_token']}"},
+        params={"shards": shards}
+    )
+    response.raise_for_status()
+
+def seat_labels(flight_id, seats):
+    layout = requests.get(f"{FLIGHTS_URL}/flights/{flight_id}/seatmap").json()
+    columns = layout["seat_columns"]
+    return [f"{seat // len(columns) + 1}{columns[seat % len(columns)]}" for seat in range(seats)]
+
+def claim_one(session, flight_id, seat):
+    response = session.post(
+        f"{FLIGHTS_URL}/flights/{flight_id}/seatmap/claim",
+        headers={"X-Internal-Token": INTERNAL_SERVICE_TOKEN},
+        json={"seats": [seat]}
+    )
+    return response.status_code
+
+def sell_out(flight_id, seats, attempts, threads):
+    """Pide cada asiento del vuelo varias veces, en orden aleatorio; solo una gana"""
+    labels = seat_labels(flight_id, seats)
+    requested = [labels[attempt % seats] for attempt in range(attempts)]
+    random.shuffle(requested)
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=threads))
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(lambda seat: claim_one(session, flight_id, seat), requested))
+
+def run_sold_out_check(login, admin, seats, attempts, threads, shards):
+    """Agota vuelos con shards y revisa que búsqueda, calendario y archivo los vean sin cupo"""
+    origin, destination = "SHD", uuid.uuid4().hex[:3].upper()
+    upcoming = datetime.utcnow() + timedelta(days=30)
+    departed = datetime.utcnow() - timedelta(days=7)
+    errors = []
+
+    flight_ids = []
+    for departure in (upcoming, departed):
+        flight_id = create_hot_flight(login, seats, origin, destination, departure)
+        enable_shards(login, flight_id, shards)
+        codes = sell_out(flight_id, seats, attempts, threads)
+        if codes.count(200) != seats:
+            errors.append(f"vuelo {flight_id}: {codes.count(200)} reservas para {seats} asientos")
+        flight_ids.append(flight_id)
+    upcoming_id, departed_id = flight_ids
+
+    day = upcoming.date().isoformat()
+    route = {"origin": origin, "destination": destination, "date": day}
+    found = [f["id"] for f in requests.get(f"{FLIGHTS_URL}/flights/search", params=route).json()]
+    if upcoming_id in found:
+        errors.append("la búsqueda muestra el vuelo agotado")
+    streamed = requests.get(f"{FLIGHTS_URL}/flights/search", params={**route, "stream": "true"})
+    if upcoming_id in [json.loads(line)["id"] for line in streamed.iter_lines() if line]:
+        errors.append("la búsqueda en streaming muestra el vuelo agotado")
+
+    calendar = requests.get(
+        f"{FLIGHTS_URL}/flights/calendar",
+        params={"origin": origin, "destination": destination, "from": day, "to": day}
+    ).json()
+    if calendar[0]["flights"] or calendar[0]["available_seats"]:
+        errors.append(f"el calendario muestra cupo: {calendar[0]}")
+
+    response = requests.post(
+        f"{FLIGHTS_URL}/flights/archive/run",
+        headers={"Authorization": f"Bearer {admin['access_token']}"}
+    )
+    response.raise_for_status()
+    archived = requests.get(f"{FLIGHTS_URL}/flights/archive/{departed_id}")
+    if archived.status_code != 200:
+        errors.append(f"el vuelo {departed_id} no quedó en el archivo")
+    elif archived.json()["available_seats"] != 0:
+        errors.append(f"el archivo guardó {archived.json()['available_seats']} asientos libres")
+
+    print(f"Vuelos agotados con {shards} shards ({origin}-{destination}): {upcoming_id} próximo, {departed_id} archivado")
+    for error in errors:
+        print(f"ERROR: {error}")
+    if not errors:
+        print("OK: búsqueda, calendario y archivo ven los vuelos sin cupo")
+    return not errors
+
+def run_stress(login, seats, attempts, threads, shards=0):
+    flight_id = create_hot_flight(login, seats)
+    if shards:
+        enable_shards(login, flight_id, shards)
+
+    start = time.perf_counter()
+    codes = sell_out(flight_id, seats, attempts, threads)
+    elapsed = time.perf_counter() - start
+
+    reserved = codes.count(200)
+    sold_out = codes.count(409)
+    remaining = requests.get(f"{FLIGHTS_URL}/flights/{flight_id}").json()["available_seats"]
+    occupied = requests.get(f"{FLIGHTS_URL}/flights/{flight_id}/seatmap").json()["occupied_seats"]
+
+    mode = f"{shards} shards" if shards else "sin shards"
+    print(f"Vuelo {flight_id} ({mode}): {seats} asientos, {attempts} intentos con {threads} hilos")
+    print(f"Reservados: {reserved}  Ocupado (409): {sold_out}  Otros: {attempts - reserved - sold_out}")
+    print(f"Asientos restantes: {remaining}  Ocupados en el mapa: {occupied}")
+    print(f"Tiempo: {elapsed:.2f}s ({attempts / elapsed:,.0f} peticiones/s)")
+
+    ok = reserved == seats and remaining == 0 and occupied == seats
+    print("OK: sin sobreventa" if ok else "ERROR: sobreventa o asientos perdidos")
+    return ok, attempts / elapsed
+
+def main():
+    seats = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else seats * 10
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    shards = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+    if not INTERNAL_SERVICE_TOKEN:
+        print("ERROR: defina INTERNAL_SERVICE_TOKEN con el valor que usa Flights Service")
+        sys.exit(1)
+
+    login = get_token(AIRLINE_USER)
+    admin = get_token(ADMIN_USER)
+    plain_ok, plain_rate = run_stress(login, seats, attempts, threads)
+    print()
+    sharded_ok, sharded_rate = run_stress(login, seats, attempts, threads, shards)
+    print()
+    print(f"Throughput con {shards} shards: x{sharded_rate / plain_rate:.2f} respecto a la fila única")
+    print()
+    # Una fila de asientos por shard con la distribución por defecto (ABCDEF)
+    visibility_ok = run_sold_out_check(login, admin, shards * 6, shards * 24, threads, shards)
+
+    if not (plain_ok and sharded_ok and visibility_ok):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,20 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Header
+import os
+import sys
+
+# Módulos compartidos entre servicios (carpeta common/ en la raíz del repositorio)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from typing import Optional, List
 from bson import ObjectId
-from models import get_booking_collection, generate_booking_code
-import requests
+from models import get_booking_collection, ensure_indexes, insert_booking, insert_bookings, SeatTakenError, BookingCodeError
+from common.token_verifier import TokenVerifier, TokenVerificationError, KeyUnavailableError
+from common.service_client import ServiceClient, AsyncServiceClient, ServiceUnavailableError
+from pagination import encode_cursor, decode_cursor, InvalidCursorError
 import uvicorn
 
 app = FastAPI(title="Bookings Service", version="1.0.0")
@@ -16,10 +25,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-AUTH_SERVICE_URL = "http://localhost:8001"
+AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://localhost:8001")
+INTERNAL_SERVICE_TOKEN = os.getenv("INTERNAL_SERVICE_TOKEN", "")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Llamadas a otros servicios: pool keep-alive, plazo total, reintentos y circuit breaker
+service_client = ServiceClient()
+
+# Los tokens se validan localmente con las llaves publicadas por auth-service
+token_verifier = TokenVerifier(AUTH_SERVICE_URL, INTERNAL_SERVICE_TOKEN, TOKEN_CACHE_SIZE, service_client)
 FLIGHTS_SERVICE_URL = "http://localhost:8002"
+# Claim/release del mapa de asientos solo aceptan llamadas de otros servicios
+INTERNAL_HEADERS = {"X-Internal-Token": INTERNAL_SERVICE_TOKEN}
+# Máximo de pasajeros en una reserva de grupo
+MAX_GROUP_SIZE = int(os.getenv("MAX_GROUP_SIZE", "9"))
+# Tamaño máximo de página en el historial de reservas de un usuario
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+BOOKING_STATUSES = {"confirmed", "checked_in", "cancelled"}
+BOOKING_FIELDS = {
+    "booking_code", "flight_id", "user_id", "passenger_name", "passenger_document",
+    "seat_number", "status", "created_at", "checked_in_at",
+}
+# Cliente async hacia flights-service, compartido por todas las peticiones
+http_client = AsyncServiceClient()
 
 # Modelos Pydantic
 class BookingCreate(BaseModel):
@@ -29,6 +61,16 @@ class BookingCreate(BaseModel):
     passenger_document: str
     seat_number: str
 
+class GroupPassenger(BaseModel):
+    passenger_name: str
+    passenger_document: str
+    seat_number: str
+
+class GroupBookingCreate(BaseModel):
+    flight_id: int
+    user_id: int
+    passengers: List[GroupPassenger]
+
 class BookingResponse(BaseModel):
     id: str
     booking_code: str
@@ -52,6 +94,8 @@ class TicketResponse(BaseModel):
     status: str
 
 # Función para verificar token Para mas placer, claro esta
+# Es sync a propósito: FastAPI la corre en el threadpool y el refresco ocasional
+# del llavero (HTTP a auth-service) no bloquea el event loop
 def verify_token(authorization: str = Header(None)):
     if not authorization:
         raise HTTPException(
@@ -59,23 +103,54 @@ def verify_token(authorization: str = Header(None)):
             detail="Token no proporcionado"
         )
     
+    token = authorization.replace("Bearer ", "")
     try:
-        token = authorization.replace("Bearer ", "")
-        response = requests.get(f"{AUTH_SERVICE_URL}/auth/verify", params={"token": token})
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido"
-            )
-        
-        return response.json()
-    except requests.RequestException:
+        return token_verifier.verify(token)
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+    except KeyUnavailableError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Servicio de autenticación no disponible"
         )
 
+# Detalle con el que flights-service rechaza un claim por falta de cupo (409)
+SOLD_OUT_DETAIL = "No hay suficientes asientos disponibles"
+
+def seat_claim_error(response, seat_message: str):
+    """HTTPException para un claim de asientos que flights-service no aceptó"""
+    detail = response.json().get("detail") if response.status_code in (400, 404, 409) else None
+    if response.status_code == 400:
+        # Asiento inexistente en la distribución del vuelo
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail or seat_message)
+    if response.status_code == 409:
+        if detail == SOLD_OUT_DETAIL:
+            return HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No hay asientos disponibles en este vuelo"
+            )
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=seat_message)
+    if response.status_code == 404:
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vuelo no encontrado")
+    # 403/503 de flights-service: típicamente INTERNAL_SERVICE_TOKEN ausente o distinto
+    print(f"flights-service rechazó el claim de asientos: {response.status_code} {response.text}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Error al actualizar asientos disponibles"
+    )
+
+@app.on_event("startup")
+async def create_indexes():
+    await ensure_indexes()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await http_client.close()
+    service_client.close()
+
 # Endpoints
 @app.get("/")
 def root():
@@ -85,8 +160,18 @@ def root():
         "status": "running"
     }
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "token_cache": token_verifier.cache.stats(),
+        "downstream": {
+            "sync": service_client.stats(),
+            "async": http_client.stats()
+        }
+    }
+
 @app.post("/bookings", response_model=BookingResponse, status_code=status.HTTP_201_CREATED)
-def create_booking(
+async def create_booking(
     booking_data: BookingCreate,
     user_data: dict = Depends(verify_token)
 ):
@@ -94,7 +179,7 @@ def create_booking(
     
     # Verificar que el vuelo existe y tiene asientos disponibles
     try:
-        flight_response = requests.get(f"{FLIGHTS_SERVICE_URL}/flights/{booking_data.flight_id}")
+        flight_response = await http_client.get(f"{FLIGHTS_SERVICE_URL}/flights/{booking_data.flight_id}")
         if flight_response.status_code != 200:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -108,64 +193,174 @@ def create_booking(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No hay asientos disponibles en este vuelo"
             )
-    except requests.RequestException:
+    except ServiceUnavailableError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Servicio de vuelos no disponible"
         )
     
-    # Verificar que el asiento no esté ocupado
-    existing_booking = bookings.find_one({
-        "flight_id": booking_data.flight_id,
-        "seat_number": booking_data.seat_number,
-        "status": {"$ne": "cancelled"}
-    })
-    
-    if existing_booking:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"El asiento {booking_data.seat_number} ya está reservado"
-        )
-    
-    # Crear reserva
-    booking_code = generate_booking_code()
+    # Crear reserva; el índice único (vuelo, asiento) rechaza un asiento ya reservado
     new_booking = {
-        "booking_code": booking_code,
         "flight_id": booking_data.flight_id,
         "user_id": booking_data.user_id,
         "passenger_name": booking_data.passenger_name,
         "passenger_document": booking_data.passenger_document,
-        "seat_number": booking_data.seat_number,
+        "seat_number": booking_data.seat_number.strip().upper(),
         "status": "confirmed",
         "created_at": datetime.utcnow().isoformat(),
         "checked_in_at": None
     }
     
-    result = bookings.insert_one(new_booking)
+    try:
+        result = await insert_booking(new_booking)
+    except SeatTakenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except BookingCodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     
-    # Actualizar asientos disponibles en el servicio de vuelos
+    # Ocupar el asiento en el mapa del vuelo (también descuenta el cupo)
     try:
-        requests.put(
-            f"{FLIGHTS_SERVICE_URL}/flights/{booking_data.flight_id}/seats",
-            params={"seats_to_reserve": 1}
+        seats_response = await http_client.post(
+            f"{FLIGHTS_SERVICE_URL}/flights/{booking_data.flight_id}/seatmap/claim",
+            json={"seats": [new_booking["seat_number"]]},
+            headers=INTERNAL_HEADERS
         )
-    except requests.RequestException:
+    except ServiceUnavailableError:
         # Revertir la reserva si falla la actualización de asientos
-        bookings.delete_one({"_id": result.inserted_id})
+        await bookings.delete_one({"_id": result.inserted_id})
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Error al actualizar asientos disponibles"
         )
     
+    # El asiento no existe, lo tomó otra reserva entre la consulta y la inserción o se agotó el vuelo
+    if seats_response.status_code != 200:
+        await bookings.delete_one({"_id": result.inserted_id})
+        raise seat_claim_error(seats_response, f"El asiento {new_booking['seat_number']} ya está reservado")
+    
     new_booking["id"] = str(result.inserted_id)
     return new_booking
 
+@app.post("/bookings/group", response_model=List[BookingResponse], status_code=status.HTTP_201_CREATED)
+async def create_group_booking(
+    group_data: GroupBookingCreate,
+    user_data: dict = Depends(verify_token)
+):
+    """Reserva varios pasajeros del mismo vuelo: quedan todos reservados o ninguno"""
+    bookings = get_booking_collection()
+    seats = [passenger.seat_number.strip().upper() for passenger in group_data.passengers]
+    
+    if not seats or len(seats) > MAX_GROUP_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Un grupo debe tener entre 1 y {MAX_GROUP_SIZE} pasajeros"
+        )
+    if len(set(seats)) != len(seats):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Hay asientos repetidos en el grupo"
+        )
+    
+    # Una sola consulta del vuelo para todo el grupo
+    try:
+        flight_response = await http_client.get(f"{FLIGHTS_SERVICE_URL}/flights/{group_data.flight_id}")
+        if flight_response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Vuelo no encontrado"
+            )
+        
+        flight = flight_response.json()
+        
+        if flight["available_seats"] < len(seats):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No hay asientos suficientes en este vuelo"
+            )
+    except ServiceUnavailableError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio de vuelos no disponible"
+        )
+    
+    # Una sola consulta para ver si alguno de los asientos ya tiene reserva activa
+    taken = await bookings.find(
+        {
+            "flight_id": group_data.flight_id,
+            "seat_number": {"$in": seats},
+            "status": {"$in": ["confirmed", "checked_in"]}
+        },
+        {"seat_number": 1, "_id": 0}
+    ).to_list(None)
+    if taken:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Asientos ya reservados: {', '.join(sorted(b['seat_number'] for b in taken))}"
+        )
+    
+    created_at = datetime.utcnow().isoformat()
+    new_bookings = [
+        {
+            "flight_id": group_data.flight_id,
+            "user_id": group_data.user_id,
+            "passenger_name": passenger.passenger_name,
+            "passenger_document": passenger.passenger_document,
+            "seat_number": seat,
+            "status": "confirmed",
+            "created_at": created_at,
+            "checked_in_at": None
+        }
+        for passenger, seat in zip(group_data.passengers, seats)
+    ]
+    
+    # El índice único (vuelo, asiento) sigue decidiendo ante reservas concurrentes
+    try:
+        result = await insert_bookings(new_bookings)
+    except SeatTakenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except BookingCodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
+    # Ocupar todos los asientos con una sola llamada (flights-service también es todo o nada)
+    try:
+        seats_response = await http_client.post(
+            f"{FLIGHTS_SERVICE_URL}/flights/{group_data.flight_id}/seatmap/claim",
+            json={"seats": seats},
+            headers=INTERNAL_HEADERS
+        )
+    except ServiceUnavailableError:
+        await bookings.delete_many({"_id": {"$in": result.inserted_ids}})
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Error al actualizar asientos disponibles"
+        )
+    
+    if seats_response.status_code != 200:
+        await bookings.delete_many({"_id": {"$in": result.inserted_ids}})
+        raise seat_claim_error(seats_response, "Alguno de los asientos ya está reservado")
+    
+    for booking in new_bookings:
+        booking["id"] = str(booking.pop("_id"))
+    return new_bookings
+
 @app.get("/bookings/{booking_id}", response_model=BookingResponse)
-def get_booking(booking_id: str, user_data: dict = Depends(verify_token)):
+async def get_booking(booking_id: str, user_data: dict = Depends(verify_token)):
     bookings = get_booking_collection()
     
     try:
-        booking = bookings.find_one({"_id": ObjectId(booking_id)})
+        booking = await bookings.find_one({"_id": ObjectId(booking_id)})
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -182,8 +377,37 @@ def get_booking(booking_id: str, user_data: dict = Depends(verify_token)):
     del booking["_id"]
     return booking
 
+def build_user_bookings_query(user_id, status_filter=None, date_from=None, date_to=None, after=None):
+    query = {"user_id": user_id}
+    if status_filter:
+        query["status"] = status_filter
+    # created_at se guarda en ISO 8601, que ordena igual como texto
+    if date_from or date_to:
+        query["created_at"] = {}
+        if date_from:
+            query["created_at"]["$gte"] = date_from.isoformat()
+        if date_to:
+            query["created_at"]["$lt"] = (date_to + timedelta(days=1)).isoformat()
+    if after:
+        created_at, booking_id = after
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": booking_id}},
+        ]
+    return query
+
 @app.get("/bookings/user/{user_id}", response_model=List[BookingResponse])
-def get_user_bookings(user_id: int, user_data: dict = Depends(verify_token)):
+async def get_user_bookings(
+    user_id: int,
+    response: Response,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_data: dict = Depends(verify_token)
+):
     # Verificar que el usuario solo pueda ver sus propias reservas
     if user_data["user_id"] != user_id and user_data["role"] != "admin":
         raise HTTPException(
@@ -191,21 +415,64 @@ def get_user_bookings(user_id: int, user_data: dict = Depends(verify_token)):
             detail="No tiene permisos para ver estas reservas"
         )
     
+    if status_filter and status_filter not in BOOKING_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Estado inválido, use uno de: {', '.join(sorted(BOOKING_STATUSES))}"
+        )
+    
+    # Solo se leen de Mongo los campos pedidos (el cursor necesita created_at)
+    projection = None
+    if fields:
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - BOOKING_FIELDS
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Campos desconocidos: {', '.join(sorted(unknown))}"
+            )
+        projection = {field: 1 for field in requested | {"created_at"}}
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+    
+    # Más recientes primero; el índice (user_id, created_at, _id) da el orden sin ordenar en memoria
     bookings = get_booking_collection()
-    user_bookings = list(bookings.find({"user_id": user_id}))
+    query = build_user_bookings_query(user_id, status_filter, date_from, date_to, after)
+    # Sin limit se devuelve todo el historial, como antes de paginar (lo usa el frontend)
+    user_bookings = bookings.find(query, projection).sort([("created_at", -1), ("_id", -1)])
+    if limit:
+        user_bookings = user_bookings.limit(limit)
+    user_bookings = await user_bookings.to_list(limit)
+    
+    headers = {}
+    if limit and len(user_bookings) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(user_bookings[-1]["created_at"], user_bookings[-1]["_id"])
     
     for booking in user_bookings:
-        booking["id"] = str(booking["_id"])
-        del booking["_id"]
+        booking["id"] = str(booking.pop("_id"))
+        if projection is not None and "created_at" not in requested:
+            del booking["created_at"]
     
+    # Con proyección la respuesta no tiene todos los campos de BookingResponse
+    if projection is not None:
+        return JSONResponse(content=user_bookings, headers=headers)
+    response.headers.update(headers)
     return user_bookings
 
 @app.post("/bookings/{booking_id}/checkin")
-def checkin(booking_id: str, user_data: dict = Depends(verify_token)):
+async def checkin(booking_id: str, user_data: dict = Depends(verify_token)):
     bookings = get_booking_collection()
     
     try:
-        booking = bookings.find_one({"_id": ObjectId(booking_id)})
+        booking = await bookings.find_one({"_id": ObjectId(booking_id)})
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -231,7 +498,7 @@ def checkin(booking_id: str, user_data: dict = Depends(verify_token)):
         )
     
     # Realizar check-in
-    bookings.update_one(
+    await bookings.update_one(
         {"_id": ObjectId(booking_id)},
         {
             "$set": {
@@ -244,11 +511,11 @@ def checkin(booking_id: str, user_data: dict = Depends(verify_token)):
     return {"message": "Check-in realizado exitosamente", "booking_id": booking_id}
 
 @app.get("/bookings/{booking_id}/ticket", response_model=TicketResponse)
-def get_ticket(booking_id: str, user_data: dict = Depends(verify_token)):
+async def get_ticket(booking_id: str, user_data: dict = Depends(verify_token)):
     bookings = get_booking_collection()
     
     try:
-        booking = bookings.find_one({"_id": ObjectId(booking_id)})
+        booking = await bookings.find_one({"_id": ObjectId(booking_id)})
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -263,7 +530,10 @@ def get_ticket(booking_id: str, user_data: dict = Depends(verify_token)):
     
     # Obtener información del vuelo
     try:
-        flight_response = requests.get(f"{FLIGHTS_SERVICE_URL}/flights/{booking['flight_id']}")
+        flight_response = await http_client.get(f"{FLIGHTS_SERVICE_URL}/flights/{booking['flight_id']}")
+        # Los vuelos que ya salieron pasan al archivo de flights-service
+        if flight_response.status_code == 404:
+            flight_response = await http_client.get(f"{FLIGHTS_SERVICE_URL}/flights/archive/{booking['flight_id']}")
         if flight_response.status_code != 200:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -271,7 +541,7 @@ def get_ticket(booking_id: str, user_data: dict = Depends(verify_token)):
             )
         
         flight = flight_response.json()
-    except requests.RequestException:
+    except ServiceUnavailableError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Servicio de vuelos no disponible"
@@ -291,11 +561,11 @@ def get_ticket(booking_id: str, user_data: dict = Depends(verify_token)):
     return ticket
 
 @app.delete("/bookings/{booking_id}")
-def cancel_booking(booking_id: str, user_data: dict = Depends(verify_token)):
+async def cancel_booking(booking_id: str, user_data: dict = Depends(verify_token)):
     bookings = get_booking_collection()
     
     try:
-        booking = bookings.find_one({"_id": ObjectId(booking_id)})
+        booking = await bookings.find_one({"_id": ObjectId(booking_id)})
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -315,12 +585,32 @@ def cancel_booking(booking_id: str, user_data: dict = Depends(verify_token)):
         )
     
     # Cancelar reserva
-    bookings.update_one(
+    await bookings.update_one(
         {"_id": ObjectId(booking_id)},
         {"$set": {"status": "cancelled"}}
     )
     
-    return {"message": "Reserva cancelada exitosamente"}
+    # Liberar el asiento en el mapa del vuelo. La cancelación ya es válida aunque
+    # falle: se registra y se informa en la respuesta para liberarlo a mano con
+    # POST /flights/{id}/seatmap/release (un 404 es un vuelo que ya no existe)
+    try:
+        release_response = await http_client.post(
+            f"{FLIGHTS_SERVICE_URL}/flights/{booking['flight_id']}/seatmap/release",
+            json={"seats": [booking["seat_number"]]},
+            headers=INTERNAL_HEADERS
+        )
+        seat_released = release_response.status_code in (200, 404)
+        error = f"{release_response.status_code} {release_response.text}"
+    except ServiceUnavailableError as e:
+        seat_released = False
+        error = str(e)
+    
+    if not seat_released:
+        print(
+            f"No se pudo liberar el asiento {booking['seat_number']} del vuelo "
+            f"{booking['flight_id']} (reserva {booking_id}): {error}"
+        )
+    return {"message": "Reserva cancelada exitosamente", "seat_released": seat_released}
 
 if __name__ == "__main__":
     print("Iniciando Bookings Service en http://localhost:8003")
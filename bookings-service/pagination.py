@@ -0,0 +1,26 @@
+"""
+Cursores opacos para paginación por llave (keyset) sobre (created_at, _id).
+"""
+
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+
+
+class InvalidCursorError(Exception):
+    """El cursor no tiene el formato esperado"""
+
+
+def encode_cursor(created_at: str, booking_id: ObjectId) -> str:
+    raw = f"{created_at}|{booking_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Devuelve la tupla (created_at, _id) de la última reserva de la página anterior"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, booking_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return created_at, ObjectId(booking_id)
+    except (ValueError, UnicodeDecodeError, InvalidId):
+        raise InvalidCursorError("Cursor inválido")
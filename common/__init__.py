@@ -0,0 +1,6 @@
+"""
+Módulos compartidos por los microservicios.
+
+Cada servicio agrega la raíz del repositorio al sys.path al arrancar (ver el
+inicio de su app.py) y los importa como common.<módulo>.
+"""
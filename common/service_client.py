@@ -0,0 +1,311 @@
+"""
+Cliente HTTP para las llamadas entre microservicios.
+
+- Conexiones keep-alive en un pool por host (requests.Session o httpx.AsyncClient).
+- Cada llamada tiene un plazo total (timeout) que incluye los reintentos; cada
+  intento usa lo que queda del plazo.
+- Reintentos acotados, con backoff exponencial y jitter, ante errores de red
+  o respuestas 502/503/504. Solo GET, HEAD y OPTIONS se reintentan solos; un
+  POST, PUT o DELETE se reintenta únicamente si quien llama pasa
+  idempotent=True (PUT /flights/{id}/seats, por ejemplo, descuenta asientos
+  y no se puede repetir).
+- Circuit breaker por host: tras BREAKER_FAILURES fallas seguidas las
+  llamadas fallan de inmediato con CircuitOpenError durante BREAKER_RESET
+  segundos; después se deja pasar una llamada de prueba que lo cierra o lo
+  vuelve a abrir.
+- Latencia por (método, host): llamadas, errores y percentiles sobre las
+  últimas LATENCY_WINDOW llamadas.
+"""
+
+from collections import deque
+from urllib.parse import urlsplit
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # solo lo necesita AsyncServiceClient
+    httpx = None
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))  # plazo total por llamada, en segundos
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "1"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.1"))  # base del backoff, en segundos
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))  # conexiones por host
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+LATENCY_WINDOW = 1000
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {502, 503, 504}
+
+
+class ServiceUnavailableError(Exception):
+    """El servicio no respondió dentro del plazo o tras los reintentos"""
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """El circuito del host está abierto: la llamada ni se intenta"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            # Medio abierto: una sola llamada de prueba a la vez
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release(self):
+        """Libera la llamada de prueba si terminó sin registrar éxito ni falla"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opens": self.opens,
+                "rejected": self.rejected,
+            }
+
+
+class LatencyRecorder:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # "MÉTODO host" -> deque de milisegundos
+        self._calls = {}
+        self._errors = {}
+
+    def record(self, key: str, seconds: float, ok: bool):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds * 1000)
+            self._calls[key] = self._calls.get(key, 0) + 1
+            if not ok:
+                self._errors[key] = self._errors.get(key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for key, samples in self._samples.items():
+                ordered = sorted(samples)
+                result[key] = {
+                    "calls": self._calls[key],
+                    "errors": self._errors.get(key, 0),
+                    "p50_ms": round(ordered[len(ordered) // 2], 2),
+                    "p99_ms": round(ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)], 2),
+                    "max_ms": round(ordered[-1], 2),
+                }
+            return result
+
+
+class _BaseServiceClient:
+    def __init__(self, timeout: float = HTTP_TIMEOUT, retries: int = HTTP_RETRIES):
+        self.timeout = timeout
+        self.retries = retries
+        self.latency = LatencyRecorder()
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def _breaker(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker()
+            return self._breakers[host]
+
+    def _attempts(self, method, retries, idempotent):
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retries = self.retries if retries is None else retries
+        return 1 + retries if idempotent else 1
+
+    @staticmethod
+    def _backoff(attempt):
+        # Jitter completo: evita que todos los clientes reintenten a la vez
+        return random.uniform(0, HTTP_BACKOFF * 2 ** attempt)
+
+    def _record(self, method, host, breaker, start, ok):
+        self.latency.record(f"{method.upper()} {host}", time.perf_counter() - start, ok)
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def stats(self):
+        with self._lock:
+            breakers = {host: breaker.stats() for host, breaker in self._breakers.items()}
+        return {"breakers": breakers, "latency": self.latency.stats()}
+
+
+class ServiceClient(_BaseServiceClient):
+    """Cliente sync sobre una requests.Session compartida"""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, retries: int = HTTP_RETRIES, pool_size: int = HTTP_POOL_SIZE):
+        super().__init__(timeout, retries)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, timeout=None, retries=None, idempotent=None, **kwargs):
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempts = self._attempts(method, retries, idempotent)
+        error = None
+        response = None
+
+        for attempt in range(attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} no disponible (circuito abierto)")
+
+            start = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, timeout=(min(HTTP_CONNECT_TIMEOUT, remaining), remaining), **kwargs
+                )
+            except requests.RequestException as e:
+                self._record(method, host, breaker, start, ok=False)
+                error, response = e, None
+            else:
+                self._record(method, host, breaker, start, ok=response.status_code < 500)
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+            finally:
+                # Cualquier otra excepción no debe dejar tomada la llamada de prueba
+                breaker.release()
+
+            if attempt < attempts - 1:
+                time.sleep(min(self._backoff(attempt), max(deadline - time.monotonic(), 0)))
+
+        # Plazo agotado: se devuelve la última respuesta 5xx si la hubo
+        if response is not None:
+            return response
+        raise ServiceUnavailableError(f"{host} no respondió") from error
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncServiceClient(_BaseServiceClient):
+    """Cliente async sobre un httpx.AsyncClient compartido"""
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, retries: int = HTTP_RETRIES, pool_size: int = HTTP_POOL_SIZE):
+        if httpx is None:
+            raise RuntimeError("AsyncServiceClient requiere httpx")
+        super().__init__(timeout, retries)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    async def request(self, method, url, timeout=None, retries=None, idempotent=None, **kwargs):
+        host = urlsplit(url).netloc
+        breaker = self._breaker(host)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempts = self._attempts(method, retries, idempotent)
+        error = None
+        response = None
+
+        for attempt in range(attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} no disponible (circuito abierto)")
+
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(
+                    method, url, timeout=httpx.Timeout(remaining, connect=min(HTTP_CONNECT_TIMEOUT, remaining)),
+                    **kwargs
+                )
+            except httpx.HTTPError as e:
+                self._record(method, host, breaker, start, ok=False)
+                error, response = e, None
+            else:
+                self._record(method, host, breaker, start, ok=response.status_code < 500)
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+            finally:
+                # También con CancelledError, si el cliente se desconecta a mitad de la llamada
+                breaker.release()
+
+            if attempt < attempts - 1:
+                await asyncio.sleep(min(self._backoff(attempt), max(deadline - time.monotonic(), 0)))
+
+        # Plazo agotado: se devuelve la última respuesta 5xx si la hubo
+        if response is not None:
+            return response
+        raise ServiceUnavailableError(f"{host} no respondió") from error
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request("DELETE", url, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
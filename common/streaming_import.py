@@ -0,0 +1,77 @@
+"""
+Lectura en streaming de archivos de importación (NDJSON o CSV).
+
+El cuerpo de la petición se procesa por líneas a medida que llega y se agrupa
+en lotes, así la memoria no depende del tamaño del archivo. Lo usan la
+importación de usuarios (auth-service) y la de itinerarios (flights-service).
+"""
+
+import csv
+import json
+
+IMPORT_FORMATS = ["ndjson", "csv"]
+
+
+async def iter_lines(stream):
+    """Convierte un stream de bytes en líneas de texto (None si no es UTF-8)"""
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield decode_line(line)
+    if buffer:
+        yield decode_line(buffer)
+
+
+def decode_line(line: bytes):
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def iter_records(stream, file_format: str):
+    """Genera (fila, registro, error) por cada línea no vacía del archivo"""
+    header = None
+    row = 0
+    async for line in iter_lines(stream):
+        if line is None:
+            row += 1
+            yield row, None, "Codificación inválida, se esperaba UTF-8"
+            continue
+        if not line.strip():
+            continue
+
+        if file_format == "csv" and header is None:
+            header = next(csv.reader([line]))
+            continue
+
+        row += 1
+        if file_format == "csv":
+            values = next(csv.reader([line]))
+            if len(values) != len(header):
+                yield row, None, "Número de columnas inválido"
+                continue
+            yield row, dict(zip(header, values)), None
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield row, None, "JSON inválido"
+                continue
+            if not isinstance(record, dict):
+                yield row, None, "Se esperaba un objeto JSON"
+                continue
+            yield row, record, None
+
+
+async def iter_batches(records, size: int):
+    batch = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,197 @@
+"""
+Verificación local de tokens JWT emitidos por auth-service (la usan flights,
+bookings y payments).
+
+En lugar de llamar a /auth/verify en cada petición, el servicio descarga el
+llavero de firma desde /auth/keys y valida firma, expiración y claims en
+proceso. Rotación de llaves:
+- auth-service firma con la llave activa y pone su "kid" en el header del token.
+- Las llaves anteriores siguen publicadas (JWT_PREVIOUS_KEYS) hasta que expiren
+  los tokens firmados con ellas.
+- Este módulo refresca el llavero cada "max_age" segundos y, si aparece un
+  "kid" desconocido, fuerza un refresco (limitado por REFRESH_COOLDOWN).
+
+Los tokens ya verificados se guardan en una caché LRU acotada, indexada por el
+SHA-256 del token, y cada entrada se descarta a más tardar en su claim "exp".
+"""
+
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+import requests
+from jose import JWTError, jwt
+
+from common.service_client import ServiceClient, ServiceUnavailableError
+
+KEYS_REQUEST_TIMEOUT = 2  # segundos
+REFRESH_COOLDOWN = 10  # segundos mínimos entre refrescos forzados
+
+
+class TokenVerificationError(Exception):
+    """El token no es válido (firma, expiración o claims)"""
+
+
+class KeyUnavailableError(Exception):
+    """No se pudo obtener el llavero de auth-service"""
+
+
+class VerifiedTokenCache:
+    """Caché LRU de claims verificados con expiración según el "exp" del token"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> (expira_en, datos)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, digest: bytes):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, data = entry
+            if expires_at <= time.time():
+                del self._entries[digest]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            # Copia: si quien llama modifica los datos, la entrada cacheada no cambia
+            return dict(data)
+
+    def put(self, digest: bytes, data: dict, expires_at: float):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[digest] = (expires_at, dict(data))
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class TokenVerifier:
+    def __init__(self, auth_service_url: str, internal_token: str, cache_size: int = 10000, client=None):
+        self.auth_service_url = auth_service_url
+        self.internal_token = internal_token
+        self.client = client or ServiceClient()
+        self.cache = VerifiedTokenCache(cache_size)
+        self._lock = threading.Lock()
+        self._algorithm = "HS256"
+        self._active_kid = None
+        self._keys = {}
+        self._max_age = 300
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+
+    def _fetch_keys(self):
+        response = self.client.get(
+            f"{self.auth_service_url}/auth/keys",
+            headers={"X-Internal-Token": self.internal_token},
+            timeout=KEYS_REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self._keys and now - self._fetched_at < self._max_age:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._keys and now - self._fetched_at < self._max_age:
+                return
+            # Evitar que tokens con "kid" inventado disparen una petición cada vez
+            if self._keys and now - self._last_attempt < REFRESH_COOLDOWN:
+                return
+
+            self._last_attempt = now
+            try:
+                data = self._fetch_keys()
+            except (ServiceUnavailableError, requests.RequestException, ValueError):
+                # Si ya tenemos llaves seguimos con ellas hasta el próximo intento
+                if self._keys:
+                    return
+                raise KeyUnavailableError("No se pudo obtener el llavero de auth-service")
+
+            # Si se retiró alguna llave, los tokens cacheados firmados con ella ya no valen
+            if not set(self._keys).issubset(data["keys"]):
+                self.cache.clear()
+
+            self._algorithm = data["algorithm"]
+            self._active_kid = data["active_kid"]
+            self._keys = dict(data["keys"])
+            self._max_age = data.get("max_age", self._max_age)
+            self._fetched_at = now
+
+    def _key_for(self, kid):
+        self._refresh()
+        kid = kid or self._active_kid
+        if kid not in self._keys:
+            self._refresh(force=True)
+        return self._keys.get(kid)
+
+    def verify(self, token: str) -> dict:
+        """Devuelve los mismos datos que /auth/verify o lanza TokenVerificationError"""
+        digest = self.cache.digest(token)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            return cached
+
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError:
+            raise TokenVerificationError("Token mal formado")
+
+        key = self._key_for(header.get("kid"))
+        if key is None or header.get("alg") != self._algorithm:
+            raise TokenVerificationError("Llave de firma desconocida")
+
+        try:
+            payload = jwt.decode(token, key, algorithms=[self._algorithm])
+        except JWTError:
+            raise TokenVerificationError("Token inválido o expirado")
+
+        user_id = payload.get("sub")
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise TokenVerificationError("Token sin usuario")
+
+        data = {
+            "valid": True,
+            "user_id": user_id,
+            "role": payload.get("role"),
+            "email": payload.get("email"),
+        }
+        # Sin "exp" el token no se cachea: no sabríamos cuándo descartarlo
+        if isinstance(payload.get("exp"), (int, float)):
+            self.cache.put(digest, data, payload["exp"])
+        return data
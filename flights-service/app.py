@@ -1,13 +1,45 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Header
+import os
+import sys
+
+# Módulos compartidos entre servicios (carpeta common/ en la raíz del repositorio)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Query, Response, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import select, tuple_, insert, func, Date
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import Optional, List
-from models import Flight, get_db
-import requests
+from datetime import datetime, timedelta, date
+from typing import Optional, List, Dict
+from models import Flight, ArchivedFlight, SessionLocal, AsyncSessionLocal, DB_ASYNC, async_engine, get_db
+from route_index import RouteIndex, flight_to_dict
+from connections import ConnectionGraph
+from fare_calendar import FareCalendarCache, FARE_CALENDAR_MAX_ROUTES, days_between
+from search_cache import SearchResponseCache, SEARCH_CACHE_SIZE
+from archive import ARCHIVE_BATCH_SIZE, archive_cutoff, archive_batch, build_archive_query
+from repricing import build_reprice_query, reprice
+from seat_shards import (
+    SEAT_SHARDS_MAX, ShardingError, shard_totals_query, apply_shard_totals, available_seats_column,
+    current_available_seats, enable_shards, disable_shards, adjust_available_seats
+)
+from seatmap import (
+    new_seat_map, get_or_create_seat_map, seat_bit, is_occupied, seat_map_occupancy, seat_map_payload,
+    change_seats, InvalidSeatError, SeatUnavailableError
+)
+from pagination import encode_cursor, decode_cursor, InvalidCursorError
+from schedule_import import IMPORT_FORMATS, IMPORT_BATCH_SIZE, iter_records, iter_batches, validate_batch
+from common.token_verifier import TokenVerifier, TokenVerificationError, KeyUnavailableError
+from common.service_client import ServiceClient
+from types import SimpleNamespace
 import uvicorn
+import asyncio
+import hmac
+import json
 import random
+import threading
 
 app = FastAPI(title="Flights Service", version="1.0.0")
 
@@ -17,9 +49,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-AUTH_SERVICE_URL = "http://localhost:8001"
+AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://localhost:8001")
+INTERNAL_SERVICE_TOKEN = os.getenv("INTERNAL_SERVICE_TOKEN", "")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Tamaño máximo de página en /flights/search
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+# Filas que trae cada viaje al cursor del servidor en modo streaming
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "500"))
+# Máximo de escalas permitidas en /flights/connections
+MAX_STOPS = int(os.getenv("MAX_STOPS", "2"))
+# Máximo de días por consulta a /flights/calendar
+MAX_CALENDAR_DAYS = int(os.getenv("MAX_CALENDAR_DAYS", "366"))
+# Máximo de ids por llamada a /flights/batch
+MAX_BATCH_IDS = int(os.getenv("MAX_BATCH_IDS", "1000"))
+# Las búsquedas excluyen vuelos que ya salieron, con la hora redondeada a
+# este número de segundos para que la respuesta (y su ETag) se pueda cachear
+SEARCH_TIME_BUCKET = int(os.getenv("SEARCH_TIME_BUCKET", "60"))
+# Segundos entre ejecuciones del archivo de vuelos que ya salieron (0 = apagado)
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+
+# Llamadas a otros servicios: pool keep-alive, plazo total, reintentos y circuit breaker
+service_client = ServiceClient()
+
+# Los tokens se validan localmente con las llaves publicadas por auth-service
+token_verifier = TokenVerifier(AUTH_SERVICE_URL, INTERNAL_SERVICE_TOKEN, TOKEN_CACHE_SIZE, service_client)
+
+# Vuelos con el cupo repartido en shards (se carga al iniciar)
+sharded_flights = set()
+# Serializa la relectura del cupo con shards tras cada reserva (index_committed_seats)
+shard_index_lock = threading.Lock()
+
+# Resultado de las ejecuciones del archivo de vuelos
+archive_stats = {"runs": 0, "archived": 0, "last_run": None}
+
+# Índice en memoria de vuelos por ruta, se carga al iniciar
+route_index = RouteIndex()
+# Grafo de rutas para la búsqueda de itinerarios con escalas
+connection_graph = ConnectionGraph()
+# Agregados diarios (precio mínimo y cupos) por ruta para /flights/calendar
+fare_calendar = FareCalendarCache(FARE_CALENDAR_MAX_ROUTES)
+# Respuestas de /flights/search con ETag, versionadas por ruta
+search_cache = SearchResponseCache(SEARCH_CACHE_SIZE)
 
 # Modelos Pydantic
 class FlightCreate(BaseModel):
@@ -36,6 +109,26 @@ class FlightUpdate(BaseModel):
     price: Optional[int] = None
     available_seats: Optional[int] = None
 
+class CalendarDayResponse(BaseModel):
+    day: date
+    min_price: Optional[int] = None
+    available_seats: int
+    flights: int
+
+class SeatsRequest(BaseModel):
+    seats: List[str]
+
+class FlightBatchRequest(BaseModel):
+    ids: List[int]
+
+class RepricingRequest(BaseModel):
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    airline_id: Optional[int] = None
+    departure_from: Optional[datetime] = None
+    departure_to: Optional[datetime] = None
+    dry_run: bool = False
+
 class FlightResponse(BaseModel):
     id: int
     flight_number: str
@@ -49,6 +142,14 @@ class FlightResponse(BaseModel):
     airline_id: int
     created_at: datetime
 
+class ItineraryResponse(BaseModel):
+    legs: List[FlightResponse]
+    stops: int
+    departure_time: datetime
+    arrival_time: datetime
+    duration_minutes: int
+    total_price: int
+
 # Función para verificar token, para mas placer
 def verify_token(authorization: str = Header(None)):
     if not authorization:
@@ -57,23 +158,33 @@ def verify_token(authorization: str = Header(None)):
             detail="Token no proporcionado"
         )
     
+    token = authorization.replace("Bearer ", "")
     try:
-        token = authorization.replace("Bearer ", "")
-        response = requests.get(f"{AUTH_SERVICE_URL}/auth/verify", params={"token": token})
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido"
-            )
-        
-        return response.json()
-    except requests.RequestException:
+        return token_verifier.verify(token)
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+    except KeyUnavailableError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Servicio de autenticación no disponible"
         )
 
+# Endpoints que solo llaman otros microservicios (bookings-service)
+def require_internal_token(x_internal_token: str = Header(None)):
+    if not INTERNAL_SERVICE_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="INTERNAL_SERVICE_TOKEN no está configurado"
+        )
+    if not hmac.compare_digest((x_internal_token or "").encode(), INTERNAL_SERVICE_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso restringido a servicios internos"
+        )
+
 # Endpoints
 @app.get("/")
 def root():
@@ -83,6 +194,120 @@ def root():
         "status": "running"
     }
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "token_cache": token_verifier.cache.stats(),
+        "downstream": service_client.stats(),
+        "route_index": route_index.stats(),
+        "connection_graph": connection_graph.stats(),
+        "fare_calendar": fare_calendar.stats(),
+        "search_cache": search_cache.stats(),
+        "archive": archive_stats
+    }
+
+# Cada cambio de un vuelo se refleja en las estructuras en memoria
+def index_flight(flight):
+    route_index.upsert(flight)
+    connection_graph.upsert(flight)
+    fare_calendar.invalidate(flight.origin, flight.destination, flight.departure_time.date())
+    search_cache.bump(flight.origin, flight.destination)
+
+def unindex_flight(flight):
+    sharded_flights.discard(flight.id)
+    route_index.remove(flight.id)
+    connection_graph.remove(flight.id)
+    fare_calendar.invalidate(flight.origin, flight.destination, flight.departure_time.date())
+    search_cache.bump(flight.origin, flight.destination)
+
+def index_seats(flight):
+    route_index.update_seats(flight.id, flight.available_seats)
+    connection_graph.update_seats(flight.id, flight.available_seats)
+    # Un vuelo que se agota o se libera cambia el precio mínimo del día
+    fare_calendar.invalidate(flight.origin, flight.destination, flight.departure_time.date())
+    search_cache.bump(flight.origin, flight.destination)
+
+def index_committed_seats(db: Session, result):
+    """Refleja en memoria el cupo de una reserva ya commiteada y lo devuelve"""
+    if result.id not in sharded_flights:
+        index_seats(result)
+        return result.available_seats
+    # Con shards, la suma que vio la transacción no incluye lo que reservas
+    # concurrentes tomaron de otros shards: se relee después del commit, bajo
+    # un lock para que la última lectura sea también la última en el índice
+    with shard_index_lock:
+        seats = current_available_seats(db, result.id)
+        index_seats(SimpleNamespace(**{**result._mapping, "available_seats": seats}))
+    return seats
+
+def index_prices(flights):
+    route_index.update_prices({flight.id: flight.price for flight in flights})
+    connection_graph.update_prices({flight.id: flight.price for flight in flights})
+    days = {(flight.origin, flight.destination, flight.departure_time.date()) for flight in flights}
+    for origin, destination, day in days:
+        fare_calendar.invalidate(origin, destination, day)
+    for origin, destination in {(origin, destination) for origin, destination, _ in days}:
+        search_cache.bump(origin, destination)
+
+def load_all_flights(db: Session):
+    """Todos los vuelos de la tabla caliente, con el cupo real de los que tienen shards"""
+    totals = dict(db.execute(shard_totals_query()).all())
+    sharded_flights.clear()
+    sharded_flights.update(totals)
+    return [SimpleNamespace(**flight) for flight in apply_shard_totals(map(flight_to_dict, db.query(Flight)), totals)]
+
+@app.on_event("startup")
+def warm_route_index():
+    db = SessionLocal()
+    try:
+        flights = load_all_flights(db)
+        route_index.load(flights)
+        connection_graph.load(flights)
+    except SQLAlchemyError:
+        # Sin índice las búsquedas van a SQL; /flights/index/check?repair=true (admin) lo carga
+        print("No se pudo cargar el índice de rutas, se usará la base de datos")
+    finally:
+        db.close()
+
+def run_archive():
+    """Archiva por lotes todos los vuelos que salieron antes del corte"""
+    cutoff = archive_cutoff()
+    archived = 0
+    db = SessionLocal()
+    try:
+        while True:
+            moved = archive_batch(db, cutoff)
+            for flight in moved:
+                unindex_flight(flight)
+            archived += len(moved)
+            if len(moved) < ARCHIVE_BATCH_SIZE:
+                break
+    finally:
+        db.close()
+    archive_stats["runs"] += 1
+    archive_stats["archived"] += archived
+    archive_stats["last_run"] = datetime.utcnow().isoformat()
+    return archived
+
+async def archive_loop():
+    while True:
+        try:
+            await run_in_threadpool(run_archive)
+        except SQLAlchemyError:
+            print("No se pudo archivar vuelos, se reintentará en la próxima ejecución")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+@app.on_event("startup")
+async def start_archive_loop():
+    if ARCHIVE_INTERVAL > 0:
+        asyncio.create_task(archive_loop())
+
+@app.on_event("shutdown")
+async def close_connections():
+    if async_engine is not None:
+        await async_engine.dispose()
+    service_client.close()
+
 @app.post("/flights", response_model=FlightResponse, status_code=status.HTTP_201_CREATED)
 def create_flight(
     flight_data: FlightCreate,
@@ -132,51 +357,476 @@ def create_flight(
     )
     
     db.add(new_flight)
+    db.flush()
+    db.add(new_seat_map(new_flight))
     db.commit()
     db.refresh(new_flight)
+    index_flight(new_flight)
     
     return new_flight
 
-@app.get("/flights/search", response_model=List[FlightResponse])
-def search_flights(
-    origin: Optional[str] = None,
-    destination: Optional[str] = None,
-    date: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    query = db.query(Flight)
+def build_search_query(origin, destination, day, after=None):
+    query = select(Flight)
     
     if origin:
-        query = query.filter(Flight.origin == origin.upper())
+        query = query.where(Flight.origin == origin.upper())
     
     if destination:
-        query = query.filter(Flight.destination == destination.upper())
+        query = query.where(Flight.destination == destination.upper())
+        
+    if day:
+        query = query.where(
+            Flight.departure_time >= datetime.combine(day, datetime.min.time()),
+            Flight.departure_time < datetime.combine(day + timedelta(days=1), datetime.min.time())
+        )
+    
+    if after:
+        query = query.where(tuple_(Flight.departure_time, Flight.id) > after)
+    
+    # Con shards el cupo es la suma de ellos, no la columna del vuelo
+    return query.where(available_seats_column() > 0).order_by(Flight.departure_time, Flight.id)
+
+def search_time_floor(now=None):
+    now = now or datetime.utcnow()
+    if SEARCH_TIME_BUCKET <= 1:
+        return now
+    bucket = timedelta(seconds=SEARCH_TIME_BUCKET)
+    return datetime.min + (now - datetime.min) // bucket * bucket
+
+async def fetch_flights(query):
+    """Ejecuta un SELECT de vuelos y devuelve la lista de dicts
+    
+    En modo async usa una AsyncSession y no ocupa un hilo mientras espera a
+    Postgres; si no, la consulta corre en el threadpool con la sesión sync.
+    Los vuelos con cupo en shards se devuelven con la suma de sus shards.
+    """
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            flights = [flight_to_dict(flight) for flight in await db.scalars(query)]
+            sharded = [flight["id"] for flight in flights if flight["id"] in sharded_flights]
+            totals = dict((await db.execute(shard_totals_query(sharded))).all()) if sharded else {}
+            return apply_shard_totals(flights, totals)
+    
+    def run():
+        with SessionLocal() as db:
+            flights = [flight_to_dict(flight) for flight in db.scalars(query)]
+            sharded = [flight["id"] for flight in flights if flight["id"] in sharded_flights]
+            totals = dict(db.execute(shard_totals_query(sharded)).all()) if sharded else {}
+            return apply_shard_totals(flights, totals)
+    return await run_in_threadpool(run)
+
+def stream_search_results(origin, destination, day, after):
+    # La sesión es propia: la de get_db se cierra antes de terminar el streaming
+    db = SessionLocal()
+    try:
+        query = build_search_query(origin, destination, day, after).add_columns(available_seats_column())
+        # yield_per activa stream_results: cursor del lado del servidor en Postgres
+        for flight, seats in db.execute(query.execution_options(yield_per=STREAM_FETCH_SIZE)):
+            row = {**flight_to_dict(flight), "available_seats": seats}
+            yield json.dumps(row, default=datetime.isoformat) + "\n"
+    finally:
+        db.close()
+
+@app.post("/flights/import")
+async def import_flights(
+    request: Request,
+    file_format: str = Query("ndjson", alias="format"),
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(verify_token)
+):
+    if user_data["role"] != "airline":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo aerolíneas pueden crear vuelos"
+        )
+    
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Formato inválido. Use: {', '.join(IMPORT_FORMATS)}"
+        )
+    
+    total = 0
+    inserted = 0
+    rejected = []
+    seen_numbers = set()
+    
+    async for batch in iter_batches(iter_records(request.stream(), file_format), IMPORT_BATCH_SIZE):
+        total += len(batch)
+        rows, errors = validate_batch(batch, user_data["user_id"])
+        rejected.extend(errors)
+        
+        # Números de vuelo repetidos en el archivo
+        candidates = []
+        for row, flight in rows:
+            if flight["flight_number"] in seen_numbers:
+                rejected.append({"row": row, "error": "Número de vuelo repetido en el archivo"})
+                continue
+            seen_numbers.add(flight["flight_number"])
+            candidates.append((row, flight))
+        
+        if not candidates:
+            continue
+        
+        # Una transacción por lote: revisar existentes con un IN e insertar el resto
+        def insert_batch():
+            numbers = [flight["flight_number"] for _, flight in candidates]
+            existing = {
+                number for (number,) in
+                db.query(Flight.flight_number).filter(Flight.flight_number.in_(numbers))
+            }
+            pending = [(row, flight) for row, flight in candidates if flight["flight_number"] not in existing]
+            duplicates = [row for row, flight in candidates if flight["flight_number"] in existing]
+            if not pending:
+                return [], duplicates, None
+            
+            try:
+                new_flights = db.scalars(
+                    insert(Flight).returning(Flight), [flight for _, flight in pending]
+                ).all()
+                db.add_all([new_seat_map(flight) for flight in new_flights])
+                # Copia plana antes del commit: tras él los objetos quedan expirados
+                # y cada atributo leído sería un SELECT más desde el event loop
+                snapshots = [SimpleNamespace(**flight_to_dict(flight)) for flight in new_flights]
+                db.commit()
+            except SQLAlchemyError:
+                db.rollback()
+                return [], duplicates, [row for row, _ in pending]
+            return snapshots, duplicates, None
         
+        new_flights, duplicates, failed = await run_in_threadpool(insert_batch)
+        rejected.extend({"row": row, "error": "El número de vuelo ya existe"} for row in duplicates)
+        if failed:
+            rejected.extend({"row": row, "error": "Error al insertar el lote"} for row in failed)
+        
+        for flight in new_flights:
+            index_flight(flight)
+        inserted += len(new_flights)
+    
+    rejected.sort(key=lambda error: error["row"])
+    return {
+        "total": total,
+        "inserted": inserted,
+        "rejected": len(rejected),
+        "errors": rejected
+    }
+
+@app.post("/flights/reprice")
+def reprice_flights(
+    request: RepricingRequest,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(verify_token)
+):
+    if user_data["role"] not in ["airline", "admin"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo aerolíneas pueden cambiar precios"
+        )
+    
+    # Una aerolínea solo reajusta sus vuelos; un admin puede hacerlo entre aerolíneas
+    airline_id = request.airline_id
+    if user_data["role"] == "airline":
+        if airline_id is not None and airline_id != user_data["user_id"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Solo puede cambiar precios de sus propios vuelos"
+            )
+        airline_id = user_data["user_id"]
+    
+    query = build_reprice_query(
+        origin=request.origin,
+        destination=request.destination,
+        airline_id=airline_id,
+        departure_from=request.departure_from,
+        departure_to=request.departure_to
+    )
+    summary, updated = reprice(db, query, dry_run=request.dry_run)
+    index_prices(updated)
+    return summary
+
+@app.get("/flights/search", response_model=List[FlightResponse])
+async def search_flights(
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    date: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    if_none_match: Optional[str] = Header(None)
+):
+    day = None
     if date:
         try:
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            query = query.filter(
-                Flight.departure_time >= date_obj,
-                Flight.departure_time < datetime(date_obj.year, date_obj.month, date_obj.day, 23, 59, 59)
-            )
+            day = datetime.strptime(date, "%Y-%m-%d").date()
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Formato de fecha inválido. Use YYYY-MM-DD"
             )
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+    
+    # Solo vuelos que todavía no salen: el corte actúa como un cursor mínimo
+    departure_floor = (search_time_floor(), 0)
+    after = max(after, departure_floor) if after else departure_floor
+    
+    # Modo streaming: NDJSON desde un cursor del servidor, memoria constante
+    if stream:
+        return StreamingResponse(
+            stream_search_results(origin, destination, day, after),
+            media_type="application/x-ndjson"
+        )
+    
+    origin = origin.upper() if origin else None
+    destination = destination.upper() if destination else None
+    route = (origin, destination) if origin and destination else None
+    
+    # La versión de la ruta cambia con cada escritura: misma versión, misma respuesta
+    cache_key = (origin, destination, day, limit, after)
+    version = search_cache.version(route)
+    etag = search_cache.etag(cache_key, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if search_cache.matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    cached = search_cache.get(cache_key, version)
+    if cached:
+        body, extra_headers = cached
+        return Response(content=body, media_type="application/json", headers={**headers, **extra_headers})
+    
+    # Las búsquedas por ruta se responden desde el índice en memoria
+    if route and route_index.ready:
+        flights = route_index.search(origin, destination, day, after, limit)
+    else:
+        query = build_search_query(origin, destination, day, after)
+        if limit:
+            query = query.limit(limit)
+        flights = await fetch_flights(query)
+    
+    # Si la página se llenó, el cliente pide la siguiente con este cursor
+    extra_headers = {}
+    if limit and len(flights) == limit:
+        extra_headers["X-Next-Cursor"] = encode_cursor(flights[-1]["departure_time"], flights[-1]["id"])
+    
+    body = json.dumps(flights, default=datetime.isoformat)
+    search_cache.put(cache_key, version, body, extra_headers)
+    return Response(content=body, media_type="application/json", headers={**headers, **extra_headers})
+
+async def load_flights_by_id(flight_ids: List[int]):
+    if len(flight_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {MAX_BATCH_IDS} ids por consulta"
+        )
+    
+    # Una sola consulta IN; los ids inexistentes no aparecen en el mapa
+    flights = await fetch_flights(select(Flight).where(Flight.id.in_(set(flight_ids)))) if flight_ids else []
+    return {flight["id"]: flight for flight in flights}
+
+@app.get("/flights/batch", response_model=Dict[int, FlightResponse])
+async def get_flights_batch(ids: str):
+    try:
+        flight_ids = [int(flight_id) for flight_id in ids.split(",") if flight_id.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids debe ser una lista de enteros separados por coma"
+        )
+    return await load_flights_by_id(flight_ids)
+
+@app.post("/flights/batch", response_model=Dict[int, FlightResponse])
+async def post_flights_batch(batch: FlightBatchRequest):
+    return await load_flights_by_id(batch.ids)
+
+@app.get("/flights/calendar", response_model=List[CalendarDayResponse])
+def get_fare_calendar(
+    origin: str,
+    destination: str,
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    db: Session = Depends(get_db)
+):
+    try:
+        start = datetime.strptime(date_from, "%Y-%m-%d").date()
+        end = datetime.strptime(date_to, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de fecha inválido. Use YYYY-MM-DD"
+        )
+    
+    if end < start or (end - start).days >= MAX_CALENDAR_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El rango debe ser de 1 a {MAX_CALENDAR_DAYS} días"
+        )
+    
+    route = (origin.upper(), destination.upper())
+    days = days_between(start, end)
+    aggregates, missing = fare_calendar.get(route, days)
+    
+    # Los días que no están en caché salen de una sola consulta agrupada
+    if missing:
+        version = fare_calendar.version(route)
+        day_column = func.date(Flight.departure_time, type_=Date)
+        seats_column = available_seats_column()
+        rows = db.query(
+            day_column,
+            func.min(Flight.price),
+            func.sum(seats_column),
+            func.count(Flight.id)
+        ).filter(
+            Flight.origin == route[0],
+            Flight.destination == route[1],
+            Flight.departure_time >= datetime.combine(min(missing), datetime.min.time()),
+            Flight.departure_time < datetime.combine(max(missing) + timedelta(days=1), datetime.min.time()),
+            seats_column > 0
+        ).group_by(day_column).all()
+        
+        computed = dict.fromkeys(missing)
+        for day, min_price, seats, flights in rows:
+            if day in computed:
+                computed[day] = {"min_price": min_price, "available_seats": int(seats), "flights": flights}
+        fare_calendar.put(route, computed, version)
+        aggregates.update(computed)
+    
+    empty = {"min_price": None, "available_seats": 0, "flights": 0}
+    return [{"day": day, **(aggregates[day] or empty)} for day in days]
+
+@app.get("/flights/connections", response_model=List[ItineraryResponse])
+def search_connections(
+    origin: str,
+    destination: str,
+    date: str,
+    max_stops: int = Query(1, ge=0),
+    min_connection: int = Query(45, ge=0, description="Minutos mínimos de conexión"),
+    max_duration: int = Query(24, ge=1, le=72, description="Horas máximas de viaje"),
+    sort: str = "arrival",
+    limit: int = Query(20, ge=1, le=100)
+):
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de fecha inválido. Use YYYY-MM-DD"
+        )
+    
+    if max_stops > MAX_STOPS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {MAX_STOPS} escalas"
+        )
+    
+    if sort not in ["arrival", "price"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Orden inválido. Use: arrival o price"
+        )
+    
+    return connection_graph.search(
+        origin.upper(),
+        destination.upper(),
+        day,
+        max_stops=max_stops,
+        min_connection=timedelta(minutes=min_connection),
+        max_duration=timedelta(hours=max_duration),
+        sort_by=sort,
+        limit=limit,
+        earliest=datetime.utcnow()
+    )
+
+@app.get("/flights/index/check")
+def check_route_index(
+    repair: bool = False,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(verify_token)
+):
+    # Carga la tabla flights completa: solo para administradores
+    if user_data["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo administradores pueden revisar el índice de rutas"
+        )
+    
+    # Compara el índice en memoria con la tabla flights (y opcionalmente lo corrige)
+    flights = load_all_flights(db)
+    result = route_index.verify_against(flights, repair=repair)
+    if result["repaired"]:
+        connection_graph.load(flights)
+        fare_calendar.clear()
+        search_cache.invalidate_all()
+    return result
 
-    flights = query.filter(Flight.available_seats > 0).all()
+@app.post("/flights/archive/run")
+async def archive_departed_flights(user_data: dict = Depends(verify_token)):
+    if user_data["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo administradores pueden archivar vuelos"
+        )
+    return {"archived": await run_in_threadpool(run_archive)}
+
+@app.get("/flights/archive", response_model=List[FlightResponse])
+async def search_archive(
+    response: Response,
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    # Consulta explícita del historial, paginada con el mismo cursor que /flights/search
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except InvalidCursorError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+    
+    query = build_archive_query(
+        origin=origin,
+        destination=destination,
+        start=datetime.combine(date_from, datetime.min.time()) if date_from else None,
+        end=datetime.combine(date_to + timedelta(days=1), datetime.min.time()) if date_to else None,
+        after=after
+    )
+    flights = await fetch_flights(query.limit(limit))
+    if len(flights) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(flights[-1]["departure_time"], flights[-1]["id"])
     return flights
 
+@app.get("/flights/archive/{flight_id}", response_model=FlightResponse)
+async def get_archived_flight(flight_id: int):
+    flights = await fetch_flights(select(ArchivedFlight).where(ArchivedFlight.id == flight_id))
+    if not flights:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vuelo no encontrado en el archivo"
+        )
+    return flights[0]
+
 @app.get("/flights/{flight_id}", response_model=FlightResponse)
-def get_flight(flight_id: int, db: Session = Depends(get_db)):
-    flight = db.query(Flight).filter(Flight.id == flight_id).first()
-    if not flight:
+async def get_flight(flight_id: int):
+    flights = await fetch_flights(select(Flight).where(Flight.id == flight_id))
+    if not flights:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Vuelo no encontrado"
         )
-    return flight
+    return flights[0]
 
 @app.put("/flights/{flight_id}/seats")
 def update_seats(
@@ -184,24 +834,136 @@ def update_seats(
     seats_to_reserve: int,
     db: Session = Depends(get_db)
 ):
-    flight = db.query(Flight).filter(Flight.id == flight_id).first()
-    if not flight:
+    # Sentencias condicionales: dos reservas concurrentes no pueden sobrevender
+    result = adjust_available_seats(db, flight_id, seats_to_reserve)
+    if result is None:
+        db.rollback()
+    else:
+        db.commit()
+    
+    if result is None:
+        if not db.query(Flight.id).filter(Flight.id == flight_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Vuelo no encontrado"
+            )
+        
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No hay suficientes asientos disponibles"
+        )
+    
+    seats = index_committed_seats(db, result)
+    
+    return {"message": "Asientos actualizados", "available_seats": seats}
+
+@app.post("/flights/{flight_id}/seats/shards")
+def enable_seat_shards(
+    flight_id: int,
+    shards: int = Query(..., ge=2),
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(verify_token)
+):
+    # Para vuelos de alta demanda: mapa y cupo se reparten en N bloques de filas de asientos
+    if user_data["role"] != "airline":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo aerolíneas pueden configurar el cupo de un vuelo"
+        )
+    
+    if shards > SEAT_SHARDS_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo {SEAT_SHARDS_MAX} shards por vuelo"
+        )
+    
+    # Los shards se arman a partir del mapa del vuelo
+    get_or_create_seat_map(db, get_flight_or_404(db, flight_id))
+    try:
+        result = enable_shards(db, flight_id, shards)
+    except ShardingError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vuelo no encontrado"
+        )
+    
+    sharded_flights.add(flight_id)
+    return result
+
+@app.delete("/flights/{flight_id}/seats/shards")
+def disable_seat_shards(
+    flight_id: int,
+    db: Session = Depends(get_db),
+    user_data: dict = Depends(verify_token)
+):
+    if user_data["role"] != "airline":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo aerolíneas pueden configurar el cupo de un vuelo"
+        )
+    
+    try:
+        result = disable_shards(db, flight_id)
+    except ShardingError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if result is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Vuelo no encontrado"
         )
     
-    if flight.available_seats < seats_to_reserve:
+    sharded_flights.discard(flight_id)
+    index_seats(result)
+    return {"flight_id": flight_id, "available_seats": result.available_seats}
+
+def get_flight_or_404(db: Session, flight_id: int):
+    flight = db.query(Flight).filter(Flight.id == flight_id).first()
+    if not flight:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No hay suficientes asientos disponibles"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vuelo no encontrado"
         )
+    return flight
+
+@app.get("/flights/{flight_id}/seatmap")
+def get_seat_map(flight_id: int, db: Session = Depends(get_db)):
+    flight = get_flight_or_404(db, flight_id)
+    seat_map = get_or_create_seat_map(db, flight)
+    return seat_map_payload(seat_map, flight, seat_map_occupancy(db, seat_map))
+
+@app.get("/flights/{flight_id}/seatmap/{seat}")
+def get_seat(flight_id: int, seat: str, db: Session = Depends(get_db)):
+    flight = get_flight_or_404(db, flight_id)
+    seat_map = get_or_create_seat_map(db, flight)
+    try:
+        bit = seat_bit(seat_map, flight.total_seats, seat)
+    except InvalidSeatError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    flight.available_seats -= seats_to_reserve
-    db.commit()
-    db.refresh(flight)
+    return {"seat": seat.strip().upper(), "occupied": is_occupied(seat_map_occupancy(db, seat_map), bit)}
+
+def update_seat_map(db: Session, flight_id: int, seats: List[str], occupy: bool):
+    flight = get_flight_or_404(db, flight_id)
+    try:
+        result = change_seats(db, flight, seats, occupy)
+    except InvalidSeatError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SeatUnavailableError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     
-    return {"message": "Asientos actualizados", "available_seats": flight.available_seats}
+    available = index_committed_seats(db, result)
+    return {"seats": [seat.strip().upper() for seat in seats], "available_seats": available}
+
+@app.post("/flights/{flight_id}/seatmap/claim", dependencies=[Depends(require_internal_token)])
+def claim_seats(flight_id: int, request: SeatsRequest, db: Session = Depends(get_db)):
+    # Todos o ninguno: si un asiento ya está ocupado no se reserva ninguno
+    return update_seat_map(db, flight_id, request.seats, occupy=True)
+
+@app.post("/flights/{flight_id}/seatmap/release", dependencies=[Depends(require_internal_token)])
+def release_seats(flight_id: int, request: SeatsRequest, db: Session = Depends(get_db)):
+    return update_seat_map(db, flight_id, request.seats, occupy=False)
 
 @app.delete("/flights/{flight_id}")
 def delete_flight(
@@ -224,6 +986,7 @@ def delete_flight(
     
     db.delete(flight)
     db.commit()
+    unindex_flight(flight)
     
     return {"message": "Vuelo eliminado exitosamente"}
 
@@ -0,0 +1,83 @@
+"""
+Archivo de vuelos que ya salieron.
+
+La tabla flights (y el índice en memoria) solo guarda vuelos próximos o que
+salieron hace poco; el proceso de archivo mueve por lotes los que salieron
+hace más de ARCHIVE_AFTER_HOURS a flights_archive, copiando e eliminando en
+la misma transacción. Así el tamaño de la tabla caliente, de sus índices y
+del índice de rutas depende del horizonte de venta y no del historial.
+
+El historial se consulta de forma explícita en /flights/archive.
+"""
+
+from datetime import datetime, timedelta
+import os
+
+from sqlalchemy import select, insert, delete, tuple_
+
+from models import Flight, ArchivedFlight
+from seat_shards import available_seats_column
+
+# Horas después de la salida en que un vuelo pasa al archivo
+ARCHIVE_AFTER_HOURS = int(os.getenv("ARCHIVE_AFTER_HOURS", "24"))
+# Vuelos movidos por transacción
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+ARCHIVE_COLUMNS = [
+    "id", "flight_number", "origin", "destination", "departure_time", "arrival_time",
+    "price", "available_seats", "total_seats", "airline_id", "created_at",
+]
+
+
+def archive_cutoff(now=None):
+    return (now or datetime.utcnow()) - timedelta(hours=ARCHIVE_AFTER_HOURS)
+
+
+def archive_batch(db, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Mueve un lote de vuelos con salida anterior a cutoff al archivo
+
+    Devuelve las filas movidas (id, origen, destino, salida) para sacarlas de
+    las estructuras en memoria.
+    """
+    # SKIP LOCKED: un vuelo que se está reservando justo ahora queda para el próximo lote
+    moved = db.execute(
+        select(Flight.id, Flight.origin, Flight.destination, Flight.departure_time)
+        .where(Flight.departure_time < cutoff)
+        .order_by(Flight.departure_time, Flight.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not moved:
+        db.rollback()
+        return []
+
+    ids = [flight.id for flight in moved]
+    # Con shards el cupo real es su suma (los shards se borran en cascada con el vuelo)
+    columns = [
+        available_seats_column() if column == "available_seats" else getattr(Flight, column)
+        for column in ARCHIVE_COLUMNS
+    ]
+    db.execute(
+        insert(ArchivedFlight).from_select(ARCHIVE_COLUMNS, select(*columns).where(Flight.id.in_(ids)))
+    )
+    # El mapa de asientos se borra en cascada con el vuelo
+    db.execute(delete(Flight).where(Flight.id.in_(ids)).execution_options(synchronize_session=False))
+    db.commit()
+    return moved
+
+
+def build_archive_query(origin=None, destination=None, start=None, end=None, after=None):
+    query = select(ArchivedFlight)
+
+    if origin:
+        query = query.where(ArchivedFlight.origin == origin.upper())
+    if destination:
+        query = query.where(ArchivedFlight.destination == destination.upper())
+    if start:
+        query = query.where(ArchivedFlight.departure_time >= start)
+    if end:
+        query = query.where(ArchivedFlight.departure_time < end)
+    if after:
+        query = query.where(tuple_(ArchivedFlight.departure_time, ArchivedFlight.id) > after)
+
+    return query.order_by(ArchivedFlight.departure_time, ArchivedFlight.id)
@@ -0,0 +1,183 @@
+"""
+Búsqueda de itinerarios con escalas sobre un grafo de rutas expandido en el tiempo.
+
+Cada aeropuerto guarda sus salidas ordenadas por hora; un itinerario es una
+cadena de vuelos donde cada salida ocurre al menos "min_connection" después
+de la llegada anterior. La búsqueda se acota por número de escalas, duración
+total y espera máxima en conexión, y se poda con los aeropuertos desde los
+que todavía se puede llegar al destino en los tramos que quedan.
+
+El grafo vive en memoria, se carga al iniciar el servicio y se actualiza con
+cada creación, cambio de asientos o eliminación de vuelos.
+"""
+
+from bisect import insort, bisect_left
+from collections import Counter
+from datetime import datetime, timedelta
+import threading
+
+from route_index import flight_to_dict
+
+# Espera máxima entre un tramo y el siguiente
+MAX_CONNECTION_WAIT = timedelta(hours=12)
+
+
+class ConnectionGraph:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._flights = {}  # id -> vuelo
+        self._departures = {}  # aeropuerto -> [(salida, id), ...]
+        self._routes = {}  # (origen, destino) -> [(salida, id), ...]
+        self._inbound = {}  # destino -> Counter(origen -> nº de vuelos)
+
+    def load(self, flights):
+        with self._lock:
+            self._flights = {}
+            self._departures = {}
+            self._routes = {}
+            self._inbound = {}
+            for flight in flights:
+                self._insert(flight_to_dict(flight))
+
+    def _insert(self, flight):
+        key = (flight["departure_time"], flight["id"])
+        self._flights[flight["id"]] = flight
+        insort(self._departures.setdefault(flight["origin"], []), key)
+        insort(self._routes.setdefault((flight["origin"], flight["destination"]), []), key)
+        self._inbound.setdefault(flight["destination"], Counter())[flight["origin"]] += 1
+
+    def _remove(self, flight_id):
+        flight = self._flights.pop(flight_id, None)
+        if flight is None:
+            return
+        key = (flight["departure_time"], flight_id)
+        for index, name in ((self._departures, flight["origin"]),
+                            (self._routes, (flight["origin"], flight["destination"]))):
+            entries = index[name]
+            entries.pop(bisect_left(entries, key))
+            if not entries:
+                del index[name]
+        inbound = self._inbound[flight["destination"]]
+        inbound[flight["origin"]] -= 1
+        if inbound[flight["origin"]] <= 0:
+            del inbound[flight["origin"]]
+
+    def upsert(self, flight):
+        with self._lock:
+            self._remove(flight.id)
+            self._insert(flight_to_dict(flight))
+
+    def remove(self, flight_id):
+        with self._lock:
+            self._remove(flight_id)
+
+    def update_seats(self, flight_id, available_seats):
+        with self._lock:
+            flight = self._flights.get(flight_id)
+            if flight is not None:
+                self._flights[flight_id] = {**flight, "available_seats": available_seats}
+
+    def update_prices(self, prices):
+        """prices: {id: nuevo precio}, en un solo paso bajo el lock"""
+        with self._lock:
+            for flight_id, price in prices.items():
+                flight = self._flights.get(flight_id)
+                if flight is not None:
+                    self._flights[flight_id] = {**flight, "price": price}
+
+    def _reachability(self, destination, max_legs):
+        """reach[k] = aeropuertos desde los que se llega al destino en k tramos o menos"""
+        reach = [{destination}]
+        for _ in range(max_legs):
+            previous = reach[-1]
+            current = set(previous)
+            for airport in previous:
+                current.update(self._inbound.get(airport, ()))
+            reach.append(current)
+        return reach
+
+    def _window(self, entries, earliest, latest):
+        start = bisect_left(entries, (earliest,))
+        for departure, flight_id in entries[start:]:
+            if departure > latest:
+                break
+            flight = self._flights[flight_id]
+            if flight["available_seats"] > 0:
+                yield flight
+
+    def search(self, origin, destination, day, max_stops=1, min_connection=timedelta(minutes=45),
+               max_duration=timedelta(hours=24), sort_by="arrival", limit=20, earliest=None):
+        """Itinerarios de origen a destino que salen el día indicado
+
+        earliest excluye los primeros tramos que salen antes (vuelos que ya salieron).
+        """
+        max_legs = max_stops + 1
+        day_start = datetime.combine(day, datetime.min.time())
+        start = max(day_start, earliest) if earliest else day_start
+        itineraries = []
+
+        with self._lock:
+            reach = self._reachability(destination, max_legs - 1)
+
+            def extend(path, visited, deadline):
+                last = path[-1]
+                if last["destination"] == destination:
+                    itineraries.append(list(path))
+                    return
+                remaining = max_legs - len(path)
+                if remaining <= 0:
+                    return
+
+                earliest = last["arrival_time"] + min_connection
+                latest = min(last["arrival_time"] + MAX_CONNECTION_WAIT, deadline)
+                # En el último tramo solo sirven vuelos directos al destino
+                if remaining == 1:
+                    candidates = self._window(self._routes.get((last["destination"], destination), []), earliest, latest)
+                else:
+                    candidates = self._window(self._departures.get(last["destination"], []), earliest, latest)
+
+                for flight in candidates:
+                    if flight["destination"] in visited or flight["arrival_time"] > deadline:
+                        continue
+                    if flight["destination"] not in reach[remaining - 1]:
+                        continue
+                    path.append(flight)
+                    visited.add(flight["destination"])
+                    extend(path, visited, deadline)
+                    visited.discard(flight["destination"])
+                    path.pop()
+
+            first_legs = self._window(self._departures.get(origin, []), start, day_start + timedelta(days=1) - timedelta(microseconds=1))
+            for flight in first_legs:
+                deadline = flight["departure_time"] + max_duration
+                if flight["arrival_time"] > deadline or flight["destination"] not in reach[max_legs - 1]:
+                    continue
+                extend([flight], {origin, flight["destination"]}, deadline)
+
+        results = [build_itinerary(legs) for legs in itineraries]
+        if sort_by == "price":
+            results.sort(key=lambda it: (it["total_price"], it["arrival_time"], it["stops"]))
+        else:
+            results.sort(key=lambda it: (it["arrival_time"], it["duration_minutes"], it["total_price"]))
+        return results[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "flights": len(self._flights),
+                "airports": len(set(self._departures) | set(self._inbound)),
+                "routes": len(self._routes),
+            }
+
+
+def build_itinerary(legs):
+    departure = legs[0]["departure_time"]
+    arrival = legs[-1]["arrival_time"]
+    return {
+        "legs": legs,
+        "stops": len(legs) - 1,
+        "departure_time": departure,
+        "arrival_time": arrival,
+        "duration_minutes": int((arrival - departure).total_seconds() // 60),
+        "total_price": sum(leg["price"] for leg in legs),
+    }
@@ -0,0 +1,89 @@
+"""
+Caché de agregados diarios por ruta para /flights/calendar.
+
+Guarda, por (origen, destino) y día, el precio mínimo, los asientos
+disponibles y el número de vuelos con cupo. Los días que faltan se calculan
+con una sola consulta agrupada y los cambios de un vuelo invalidan solo el
+día de su ruta.
+
+Cada invalidación sube la versión de la ruta. Quien calcula días que faltan
+toma la versión antes de consultar y put descarta el resultado si cambió
+mientras tanto (como SearchResponseCache), porque las entradas no expiran.
+"""
+
+from collections import OrderedDict
+from datetime import timedelta
+import os
+import threading
+
+FARE_CALENDAR_MAX_ROUTES = int(os.getenv("FARE_CALENDAR_MAX_ROUTES", "5000"))
+
+
+def days_between(start, end):
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+class FareCalendarCache:
+    def __init__(self, max_routes: int):
+        self.max_routes = max_routes
+        self._routes = OrderedDict()  # (origen, destino) -> {día: agregado o None}
+        self._versions = {}  # (origen, destino) -> versión
+        self._generation = 0  # sube con clear()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.discarded = 0
+
+    def get(self, route, days):
+        """Devuelve ({día: agregado} en caché, [días que faltan])"""
+        with self._lock:
+            cached = self._routes.get(route, {})
+            if route in self._routes:
+                self._routes.move_to_end(route)
+            found = {day: cached[day] for day in days if day in cached}
+            missing = [day for day in days if day not in cached]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def version(self, route):
+        with self._lock:
+            return self._generation, self._versions.get(route, 0)
+
+    def put(self, route, aggregates, version):
+        with self._lock:
+            # Un vuelo de la ruta cambió durante la consulta: el resultado puede estar viejo
+            if version != (self._generation, self._versions.get(route, 0)):
+                self.discarded += 1
+                return
+            self._routes.setdefault(route, {}).update(aggregates)
+            self._routes.move_to_end(route)
+            while len(self._routes) > self.max_routes:
+                self._routes.popitem(last=False)
+
+    def invalidate(self, origin, destination, day):
+        with self._lock:
+            route = (origin, destination)
+            # Aunque el día no esté en caché: puede haber un cálculo en curso
+            self._versions[route] = self._versions.get(route, 0) + 1
+            cached = self._routes.get(route, {})
+            if day in cached:
+                del cached[day]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "routes": len(self._routes),
+                "max_routes": self.max_routes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "discarded": self.discarded,
+            }
@@ -0,0 +1,25 @@
+"""
+Cursores opacos para paginación por llave (keyset) sobre (departure_time, id).
+"""
+
+from datetime import datetime
+import base64
+
+
+class InvalidCursorError(Exception):
+    """El cursor no tiene el formato esperado"""
+
+
+def encode_cursor(departure_time: datetime, flight_id: int) -> str:
+    raw = f"{departure_time.isoformat()}|{flight_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Devuelve la tupla (departure_time, id) del último vuelo de la página anterior"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        departure, flight_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(departure), int(flight_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursorError("Cursor inválido")
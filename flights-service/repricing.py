@@ -0,0 +1,115 @@
+"""
+Reajuste masivo de precios de vuelos.
+
+Carga (id, precio, asientos libres, asientos totales, salida) de los vuelos
+seleccionados en arreglos columnares de numpy y calcula todos los precios
+nuevos a la vez a partir de la ocupación y de los días que faltan para la
+salida. Solo los vuelos cuyo precio cambia se escriben, con un único
+UPDATE ... FROM unnest(ids, precios anteriores, precios nuevos); si el precio
+de un vuelo cambió mientras tanto, esa fila no se toca.
+
+Cada ejecución mueve el precio como máximo REPRICE_MAX_STEP hacia arriba o
+hacia abajo, así que el job se puede correr de forma periódica.
+"""
+
+from datetime import datetime
+import os
+
+import numpy as np
+from sqlalchemy import select, update, func, literal, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from models import Flight
+from seat_shards import available_seats_column
+
+# Ocupación a partir de la cual el precio sube
+REPRICE_TARGET_LOAD = float(os.getenv("REPRICE_TARGET_LOAD", "0.7"))
+# Cuánto pesa la diferencia con la ocupación objetivo
+REPRICE_LOAD_WEIGHT = float(os.getenv("REPRICE_LOAD_WEIGHT", "0.3"))
+# Días antes de la salida en que empieza el recargo por cercanía
+REPRICE_URGENCY_DAYS = float(os.getenv("REPRICE_URGENCY_DAYS", "14"))
+# Recargo máximo el día de la salida
+REPRICE_URGENCY_PREMIUM = float(os.getenv("REPRICE_URGENCY_PREMIUM", "0.2"))
+# Cambio máximo por ejecución, en fracción del precio actual
+REPRICE_MAX_STEP = float(os.getenv("REPRICE_MAX_STEP", "0.15"))
+REPRICE_MIN_PRICE = int(os.getenv("REPRICE_MIN_PRICE", "1"))
+
+
+def build_reprice_query(origin=None, destination=None, airline_id=None,
+                        departure_from=None, departure_to=None, now=None):
+    # Los vuelos que ya salieron no se reajustan
+    query = select(
+        Flight.id, Flight.price, available_seats_column(), Flight.total_seats, Flight.departure_time
+    ).where(Flight.departure_time > (now or datetime.utcnow()))
+
+    if origin:
+        query = query.where(Flight.origin == origin.upper())
+    if destination:
+        query = query.where(Flight.destination == destination.upper())
+    if airline_id is not None:
+        query = query.where(Flight.airline_id == airline_id)
+    if departure_from:
+        query = query.where(Flight.departure_time >= departure_from)
+    if departure_to:
+        query = query.where(Flight.departure_time < departure_to)
+    return query
+
+
+def rows_to_columns(rows):
+    if not rows:
+        return None
+    ids, prices, available, total, departures = zip(*rows)
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "price": np.array(prices, dtype=np.int64),
+        "available_seats": np.array(available, dtype=np.int64),
+        "total_seats": np.array(total, dtype=np.int64),
+        "departure_time": np.array(departures, dtype="datetime64[s]"),
+    }
+
+
+def compute_prices(columns, now):
+    load = 1 - columns["available_seats"] / np.maximum(columns["total_seats"], 1)
+    days = (columns["departure_time"] - np.datetime64(now, "s")) / np.timedelta64(1, "D")
+
+    factor = 1 + REPRICE_LOAD_WEIGHT * (load - REPRICE_TARGET_LOAD)
+    factor += REPRICE_URGENCY_PREMIUM * np.clip(1 - days / REPRICE_URGENCY_DAYS, 0, 1)
+    factor = np.clip(factor, 1 - REPRICE_MAX_STEP, 1 + REPRICE_MAX_STEP)
+    return np.maximum(np.rint(columns["price"] * factor), REPRICE_MIN_PRICE).astype(np.int64)
+
+
+def write_prices(db, ids, old_prices, new_prices):
+    data = func.unnest(
+        literal(ids.tolist(), ARRAY(Integer)),
+        literal(old_prices.tolist(), ARRAY(Integer)),
+        literal(new_prices.tolist(), ARRAY(Integer)),
+    ).table_valued("id", "old_price", "price").render_derived(name="data")
+
+    updated = db.execute(
+        update(Flight)
+        .where(Flight.id == data.c.id, Flight.price == data.c.old_price)
+        .values(price=data.c.price)
+        .returning(Flight.id, Flight.price, Flight.origin, Flight.destination, Flight.departure_time)
+    ).all()
+    db.commit()
+    return updated
+
+
+def reprice(db, query, dry_run=False, now=None):
+    """Reajusta los vuelos del query y devuelve (resumen, filas actualizadas)"""
+    now = now or datetime.utcnow()
+    columns = rows_to_columns(db.execute(query).all())
+    if columns is None:
+        return {"flights": 0, "changed": 0, "updated": 0, "skipped": 0}, []
+
+    new_prices = compute_prices(columns, now)
+    changed = new_prices != columns["price"]
+    summary = {"flights": len(columns["id"]), "changed": int(changed.sum())}
+
+    updated = []
+    if summary["changed"] and not dry_run:
+        updated = write_prices(db, columns["id"][changed], columns["price"][changed], new_prices[changed])
+    summary["updated"] = len(updated)
+    # Vuelos cuyo precio cambió entre la lectura y la escritura
+    summary["skipped"] = 0 if dry_run else summary["changed"] - len(updated)
+    return summary, updated
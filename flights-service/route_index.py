@@ -0,0 +1,139 @@
+"""
+Índice en memoria de vuelos por ruta para /flights/search.
+
+Agrupa los vuelos por (origen, destino) y por día de salida, ordenados por
+hora de salida. Se carga al iniciar el servicio y se actualiza en cada
+creación, cambio de asientos o eliminación de vuelos, así las búsquedas por
+ruta no necesitan ir a la base de datos.
+
+El índice es por proceso: si hay varias instancias, cada una mantiene el
+suyo y verify_against() permite detectar y corregir desvíos con la base.
+"""
+
+from bisect import insort, bisect_left, bisect_right
+import threading
+
+FLIGHT_FIELDS = [
+    "id", "flight_number", "origin", "destination", "departure_time", "arrival_time",
+    "price", "available_seats", "total_seats", "airline_id", "created_at",
+]
+
+
+def flight_to_dict(flight):
+    return {field: getattr(flight, field) for field in FLIGHT_FIELDS}
+
+
+class RouteIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._flights = {}  # id -> vuelo
+        self._routes = {}  # (origen, destino) -> {día: [(salida, id), ...]}
+        self.ready = False
+
+    def load(self, flights):
+        with self._lock:
+            self._flights = {}
+            self._routes = {}
+            for flight in flights:
+                self._insert(flight_to_dict(flight))
+            self.ready = True
+
+    def _insert(self, flight):
+        self._flights[flight["id"]] = flight
+        days = self._routes.setdefault((flight["origin"], flight["destination"]), {})
+        insort(days.setdefault(flight["departure_time"].date(), []), (flight["departure_time"], flight["id"]))
+
+    def _remove(self, flight_id):
+        flight = self._flights.pop(flight_id, None)
+        if flight is None:
+            return
+        route = (flight["origin"], flight["destination"])
+        day = flight["departure_time"].date()
+        entries = self._routes[route][day]
+        entries.pop(bisect_left(entries, (flight["departure_time"], flight_id)))
+        if not entries:
+            del self._routes[route][day]
+            if not self._routes[route]:
+                del self._routes[route]
+
+    def upsert(self, flight):
+        with self._lock:
+            self._remove(flight.id)
+            self._insert(flight_to_dict(flight))
+
+    def remove(self, flight_id):
+        with self._lock:
+            self._remove(flight_id)
+
+    def update_seats(self, flight_id, available_seats):
+        with self._lock:
+            flight = self._flights.get(flight_id)
+            if flight is not None:
+                self._flights[flight_id] = {**flight, "available_seats": available_seats}
+
+    def update_prices(self, prices):
+        """prices: {id: nuevo precio}, en un solo paso bajo el lock"""
+        with self._lock:
+            for flight_id, price in prices.items():
+                flight = self._flights.get(flight_id)
+                if flight is not None:
+                    self._flights[flight_id] = {**flight, "price": price}
+
+    def search(self, origin, destination, day=None, after=None, limit=None):
+        """Vuelos de la ruta con asientos disponibles, ordenados por (salida, id)
+
+        after es la llave (salida, id) del último vuelo ya entregado.
+        """
+        results = []
+        with self._lock:
+            days = self._routes.get((origin, destination), {})
+            selected = [day] if day is not None else sorted(days)
+            for d in selected:
+                if after is not None and d < after[0].date():
+                    continue
+                entries = days.get(d, [])
+                start = bisect_right(entries, after) if after is not None else 0
+                for _, flight_id in entries[start:]:
+                    flight = self._flights[flight_id]
+                    if flight["available_seats"] <= 0:
+                        continue
+                    results.append(flight)
+                    if limit is not None and len(results) >= limit:
+                        return results
+        return results
+
+    def verify_against(self, flights, repair=False):
+        """Compara el índice con los vuelos de la base de datos"""
+        expected = {flight.id: flight_to_dict(flight) for flight in flights}
+        with self._lock:
+            missing = sorted(set(expected) - set(self._flights))
+            extra = sorted(set(self._flights) - set(expected))
+            stale = sorted(
+                flight_id for flight_id in set(expected) & set(self._flights)
+                if expected[flight_id] != self._flights[flight_id]
+            )
+            consistent = not (missing or extra or stale)
+            if repair and not consistent:
+                for flight_id in extra + stale:
+                    self._remove(flight_id)
+                for flight_id in missing + stale:
+                    self._insert(expected[flight_id])
+            if repair:
+                self.ready = True
+
+        return {
+            "consistent": consistent,
+            "indexed": len(self._flights),
+            "missing": missing,
+            "extra": extra,
+            "stale": stale,
+            "repaired": repair and not consistent,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "flights": len(self._flights),
+                "routes": len(self._routes),
+            }
@@ -0,0 +1,68 @@
+"""
+Importación masiva de itinerarios (NDJSON o CSV).
+
+El cuerpo de la petición se lee en streaming (common/streaming_import.py) y
+se procesa en lotes de IMPORT_BATCH_SIZE filas: cada lote se valida en una
+sola pasada, se revisan los números de vuelo repetidos con una consulta IN y
+se inserta con un INSERT multi-fila dentro de su propia transacción.
+"""
+
+from datetime import datetime
+import os
+import uuid
+
+from common.streaming_import import IMPORT_FORMATS, iter_records, iter_batches
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+
+def generate_flight_number():
+    return f"FL-{uuid.uuid4().hex[:10].upper()}"
+
+
+def validate_batch(batch, default_airline_id: int):
+    """Convierte un lote en filas listas para insertar y una lista de errores
+
+    Aplica las mismas reglas que POST /flights. Si la fila no trae
+    flight_number se genera uno único.
+    """
+    rows = []
+    errors = []
+    for row, record, error in batch:
+        if error:
+            errors.append({"row": row, "error": error})
+            continue
+
+        try:
+            flight = {
+                "flight_number": str(record.get("flight_number") or generate_flight_number()).strip(),
+                "origin": str(record["origin"]).strip().upper(),
+                "destination": str(record["destination"]).strip().upper(),
+                "departure_time": datetime.fromisoformat(str(record["departure_time"])),
+                "arrival_time": datetime.fromisoformat(str(record["arrival_time"])),
+                "price": int(record["price"]),
+                "total_seats": int(record["total_seats"]),
+                "airline_id": int(record.get("airline_id") or default_airline_id),
+            }
+            # Dentro del try: mezclar horas con y sin zona horaria da TypeError
+            arrives_after = flight["arrival_time"] > flight["departure_time"]
+        except KeyError as e:
+            errors.append({"row": row, "error": f"Falta el campo {e.args[0]}"})
+            continue
+        except (TypeError, ValueError):
+            errors.append({"row": row, "error": "Valor con formato inválido"})
+            continue
+
+        if not flight["origin"] or not flight["destination"]:
+            errors.append({"row": row, "error": "Origen y destino son obligatorios"})
+        elif not arrives_after:
+            errors.append({"row": row, "error": "La hora de llegada debe ser posterior a la de salida"})
+        elif flight["total_seats"] <= 0:
+            errors.append({"row": row, "error": "El número total de asientos debe ser mayor a 0"})
+        elif flight["price"] < 0:
+            errors.append({"row": row, "error": "El precio no puede ser negativo"})
+        else:
+            flight["available_seats"] = flight["total_seats"]
+            rows.append((row, flight))
+
+    return rows, errors
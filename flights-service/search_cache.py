@@ -0,0 +1,94 @@
+"""
+Caché de respuestas de /flights/search con ETag.
+
+Cada ruta (origen, destino) tiene un contador de versión que se incrementa
+con cualquier cambio en sus vuelos; las búsquedas sin ruta completa usan un
+contador global. La ETag se deriva de la versión y de los parámetros
+normalizados, así que un cliente que revalida con If-None-Match recibe 304
+sin consultar la base ni serializar nada.
+"""
+
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import uuid
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+
+
+class SearchResponseCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # Distingue las ETags de cada proceso: los contadores son locales
+        self._instance = uuid.uuid4().hex[:8]
+        self._versions = {}  # (origen, destino) -> versión
+        self._global_version = 0
+        self._entries = OrderedDict()  # llave -> (versión, cuerpo, headers)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self, route):
+        with self._lock:
+            if route is None:
+                return self._global_version
+            return self._versions.get(route, 0)
+
+    def bump(self, origin, destination):
+        with self._lock:
+            route = (origin, destination)
+            self._versions[route] = self._versions.get(route, 0) + 1
+            self._global_version += 1
+
+    def invalidate_all(self):
+        # Con un nuevo identificador ninguna ETag anterior vuelve a coincidir
+        with self._lock:
+            self._instance = uuid.uuid4().hex[:8]
+            self._entries.clear()
+
+    def etag(self, key, version):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        with self._lock:
+            return f'"{self._instance}-{version}-{digest}"'
+
+    def matches(self, if_none_match, etag):
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        matched = "*" in tags or etag in tags or f"W/{etag}" in tags
+        if matched:
+            with self._lock:
+                self.not_modified += 1
+        return matched
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, version, body, headers):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "routes_tracked": len(self._versions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
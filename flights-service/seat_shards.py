@@ -0,0 +1,315 @@
+"""
+Mapa de asientos y cupo repartidos en shards para vuelos de alta demanda.
+
+Por defecto cada reserva cambia la fila del vuelo en flight_seat_maps y en
+flights, así que en una venta masiva todas esperan el lock de las mismas
+filas. Al activar shards para un vuelo sus filas de asientos se reparten en
+N bloques contiguos: cada fila de flight_seat_shards guarda los bits de su
+bloque y su parte del cupo. Reservar asientos concretos (seatmap.change_seats)
+bloquea solo los shards dueños de esos asientos, de modo que reservas en
+bloques distintos avanzan en paralelo. Las reservas sin asiento
+(PUT /flights/{id}/seats) toman el cupo de un shard libre elegido al azar
+(FOR UPDATE SKIP LOCKED) y, si ninguno alcanza, bloquean todos en orden.
+
+El cupo del vuelo es la suma de sus shards y su mapa la unión de los bloques.
+Mientras el vuelo tiene shards flights.available_seats y la ocupación de
+flight_seat_maps no se tocan (escribirlas en cada reserva volvería a
+serializar todo en una fila) y recién se recalculan al desactivarlos; toda
+consulta SQL que lea el cupo debe usar available_seats_column().
+
+Los locks se toman siempre en el orden mapa del vuelo, vuelo, shards (por
+número), así activar o desactivar shards no se cruza con una reserva.
+"""
+
+import math
+import os
+
+from sqlalchemy import select, update, insert, delete, func
+
+from models import Flight, SeatMap, SeatShard
+
+# Máximo de shards por vuelo
+SEAT_SHARDS_MAX = int(os.getenv("SEAT_SHARDS_MAX", "64"))
+
+
+class ShardingError(Exception):
+    """El vuelo ya tiene (o no tiene) el cupo repartido en shards, o no alcanzan sus filas"""
+
+
+def split_seats(available, shards):
+    return [available // shards + (1 if i < available % shards else 0) for i in range(shards)]
+
+
+def is_sharded(db, flight_id):
+    return db.scalar(select(SeatShard.shard).where(SeatShard.flight_id == flight_id).limit(1)) is not None
+
+
+def shard_totals_query(flight_ids=None):
+    """(flight_id, suma de sus shards) de los vuelos con shards"""
+    query = select(SeatShard.flight_id, func.sum(SeatShard.available_seats)).group_by(SeatShard.flight_id)
+    if flight_ids is not None:
+        query = query.where(SeatShard.flight_id.in_(flight_ids))
+    return query
+
+
+def available_seats_column():
+    """Cupo real de cada vuelo en una consulta sobre flights
+
+    Suma de sus shards si los tiene; si no, flights.available_seats.
+    """
+    shard_total = (
+        select(func.sum(SeatShard.available_seats))
+        .where(SeatShard.flight_id == Flight.id)
+        .scalar_subquery()
+    )
+    return func.coalesce(shard_total, Flight.available_seats)
+
+
+def current_available_seats(db, flight_id):
+    return db.scalar(select(available_seats_column()).where(Flight.id == flight_id))
+
+
+def apply_shard_totals(flights, totals):
+    """Reemplaza available_seats de los vuelos (dicts) con la suma de sus shards"""
+    return [
+        {**flight, "available_seats": int(totals[flight["id"]])} if flight["id"] in totals else flight
+        for flight in flights
+    ]
+
+
+def row_blocks(rows, shards):
+    """(primera fila, filas) de cada shard: bloques contiguos de tamaño parejo"""
+    blocks, first_row = [], 0
+    for size in split_seats(rows, shards):
+        blocks.append((first_row, size))
+        first_row += size
+    return blocks
+
+
+def block_seats(first_row, rows, seats_per_row, total_seats):
+    """Asientos reales de un bloque (la última fila del vuelo puede estar incompleta)"""
+    start = first_row * seats_per_row
+    return max(0, min((first_row + rows) * seats_per_row, total_seats) - start)
+
+
+def count_bits(occupancy):
+    return sum(bin(byte).count("1") for byte in occupancy)
+
+
+def split_occupancy(occupancy, blocks, seats_per_row):
+    """Corta el bitmap del vuelo en un bitmap por bloque, numerado desde su primera fila"""
+    bits = int.from_bytes(occupancy, "little")
+    segments = []
+    for first_row, rows in blocks:
+        size = rows * seats_per_row
+        segment = bits >> (first_row * seats_per_row) & ((1 << size) - 1)
+        segments.append(segment.to_bytes(math.ceil(size / 8), "little"))
+    return segments
+
+
+def join_occupancy(length, segments, seats_per_row):
+    """Arma el bitmap del vuelo (length bytes) con los (primera fila, bitmap) de sus bloques"""
+    bits = 0
+    for first_row, occupancy in segments:
+        bits |= int.from_bytes(occupancy, "little") << (first_row * seats_per_row)
+    return bits.to_bytes(length, "little")
+
+
+def split_available(available, free):
+    """Reparte el cupo del vuelo según los asientos libres de cada bloque
+
+    Si se vendió cupo sin asiento asignado (PUT /flights/{id}/seats) hay menos
+    cupo que asientos libres: la diferencia se descuenta desde el último bloque.
+    """
+    counters = list(free)
+    missing = sum(free) - available
+    for shard in reversed(range(len(counters))):
+        if missing <= 0:
+            break
+        take = min(counters[shard], missing)
+        counters[shard] -= take
+        missing -= take
+    if missing < 0:
+        counters[0] -= missing
+    return counters
+
+
+def enable_shards(db, flight_id, shards):
+    """Reparte mapa y cupo del vuelo en shards; el mapa del vuelo ya debe existir"""
+    # Mismo orden de locks que una reserva: mapa del vuelo y después el vuelo
+    seat_map = db.execute(
+        select(SeatMap).where(SeatMap.flight_id == flight_id).with_for_update()
+    ).scalar_one_or_none()
+    flight = db.execute(select(Flight).where(Flight.id == flight_id).with_for_update()).scalar_one_or_none()
+    if seat_map is None or flight is None:
+        db.rollback()
+        return None
+    if seat_map.shards:
+        db.rollback()
+        raise ShardingError("El vuelo ya tiene el cupo repartido en shards")
+    if shards > seat_map.rows:
+        db.rollback()
+        raise ShardingError(f"El vuelo tiene {seat_map.rows} filas de asientos, no alcanzan para {shards} shards")
+
+    seats_per_row = len(seat_map.seat_columns)
+    blocks = row_blocks(seat_map.rows, shards)
+    segments = split_occupancy(seat_map.occupancy, blocks, seats_per_row)
+    free = [
+        block_seats(first_row, rows, seats_per_row, flight.total_seats) - count_bits(segment)
+        for (first_row, rows), segment in zip(blocks, segments)
+    ]
+    available = flight.available_seats
+    db.execute(insert(SeatShard), [
+        {"flight_id": flight_id, "shard": shard, "first_row": first_row, "rows": rows,
+         "occupancy": segment, "available_seats": seats}
+        for shard, ((first_row, rows), segment, seats)
+        in enumerate(zip(blocks, segments, split_available(available, free)))
+    ])
+    seat_map.shards = shards
+    db.commit()
+    return {"flight_id": flight_id, "shards": shards, "available_seats": available}
+
+
+def disable_shards(db, flight_id):
+    """Junta los shards de vuelta en el mapa y en flights.available_seats y los elimina"""
+    seat_map = db.execute(
+        select(SeatMap).where(SeatMap.flight_id == flight_id).with_for_update()
+    ).scalar_one_or_none()
+    flight = db.execute(select(Flight.id).where(Flight.id == flight_id).with_for_update()).first()
+    if flight is None:
+        db.rollback()
+        return None
+    if seat_map is None or not seat_map.shards:
+        db.rollback()
+        raise ShardingError("El vuelo no tiene el cupo repartido en shards")
+    shards = db.scalars(
+        select(SeatShard).where(SeatShard.flight_id == flight_id).order_by(SeatShard.shard).with_for_update()
+    ).all()
+
+    available = sum(shard.available_seats for shard in shards)
+    seat_map.occupancy = join_occupancy(
+        len(seat_map.occupancy),
+        [(shard.first_row, shard.occupancy) for shard in shards],
+        len(seat_map.seat_columns)
+    )
+    seat_map.shards = 0
+    db.execute(delete(SeatShard).where(SeatShard.flight_id == flight_id))
+    result = db.execute(
+        update(Flight)
+        .where(Flight.id == flight_id)
+        .values(available_seats=available)
+        .returning(Flight.id, Flight.available_seats, Flight.origin, Flight.destination, Flight.departure_time)
+    ).first()
+    db.commit()
+    return result
+
+
+def take_from_shards(db, flight_id, seats):
+    """Descuenta seats (negativo = libera) de los shards del vuelo, sin commit"""
+    # Camino rápido: cualquier shard que nadie tenga bloqueado y alcance
+    candidate = (
+        select(SeatShard.shard)
+        .where(SeatShard.flight_id == flight_id, SeatShard.available_seats >= seats)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    taken = db.execute(
+        update(SeatShard)
+        .where(SeatShard.flight_id == flight_id, SeatShard.shard == candidate)
+        .values(available_seats=SeatShard.available_seats - seats)
+        .returning(SeatShard.shard)
+    ).first()
+    if taken is not None:
+        return True
+
+    # Camino lento: bloquear todos los shards en orden (sin deadlocks) y repartir
+    shards = db.scalars(
+        select(SeatShard).where(SeatShard.flight_id == flight_id).order_by(SeatShard.shard).with_for_update()
+    ).all()
+    if not shards or sum(shard.available_seats for shard in shards) < seats:
+        return False
+    remaining = seats
+    for shard in shards:
+        take = min(shard.available_seats, remaining)
+        shard.available_seats -= take
+        remaining -= take
+        if remaining <= 0:
+            break
+    db.flush()
+    return True
+
+
+def borrow_seats(db, flight_id, seats):
+    """Descuenta seats del cupo de cualquier shard del vuelo que tenga, sin commit
+
+    Para cuando el bloque de un asiento pedido se quedó sin cupo. SKIP LOCKED
+    evita esperar (y cruzarse en deadlock) a reservas que tienen otros shards;
+    los shards que ya bloqueó esta transacción no se saltan.
+    """
+    while seats > 0:
+        donor = db.scalars(
+            select(SeatShard)
+            .where(SeatShard.flight_id == flight_id, SeatShard.available_seats > 0)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if donor is None:
+            return False
+        taken = min(donor.available_seats, seats)
+        donor.available_seats -= taken
+        seats -= taken
+        db.flush()
+    return True
+
+
+def adjust_available_seats(db, flight_id, seats):
+    """Descuenta seats del cupo del vuelo (negativo = libera), sin commit
+
+    Devuelve la fila (id, available_seats, origin, destination, departure_time)
+    con el cupo resultante, o None si no alcanza o se pasaría del total. Con
+    shards, el cupo es la suma vista por esta transacción: no incluye lo que
+    otras reservas sin commit tomaron de otros shards.
+    """
+    if not is_sharded(db, flight_id):
+        # Una sola sentencia condicional: dos reservas concurrentes no pueden sobrevender
+        result = db.execute(
+            update(Flight)
+            .where(
+                Flight.id == flight_id,
+                Flight.available_seats >= seats,
+                Flight.available_seats - seats <= Flight.total_seats
+            )
+            .values(available_seats=Flight.available_seats - seats)
+            .returning(Flight.id, Flight.available_seats, Flight.origin, Flight.destination, Flight.departure_time)
+        ).first()
+        if result is None or not is_sharded(db, flight_id):
+            return result
+        # Se activaron shards mientras se esperaba el lock: se deshace y se toma de los shards
+        db.execute(update(Flight).where(Flight.id == flight_id).values(available_seats=Flight.available_seats + seats))
+
+    if not take_from_shards(db, flight_id, seats):
+        # Si se desactivaron los shards mientras tanto, el cupo volvió a la fila del vuelo
+        if not is_sharded(db, flight_id):
+            return adjust_available_seats(db, flight_id, seats)
+        return None
+
+    result = shard_total(db, flight_id)
+    if result.available_seats > result.total_seats:
+        return None
+    return result
+
+
+def shard_total(db, flight_id):
+    """Fila del vuelo con el cupo como la suma de sus shards que ve esta transacción"""
+    total = (
+        select(func.coalesce(func.sum(SeatShard.available_seats), 0))
+        .where(SeatShard.flight_id == flight_id)
+        .scalar_subquery()
+    )
+    return db.execute(
+        select(Flight.id, total.label("available_seats"), Flight.origin, Flight.destination,
+               Flight.departure_time, Flight.total_seats)
+        .where(Flight.id == flight_id)
+    ).first()
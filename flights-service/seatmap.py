@@ -0,0 +1,212 @@
+"""
+Mapa de asientos por vuelo guardado como bitmap.
+
+Cada vuelo tiene una fila en flight_seat_maps con su distribución (filas y
+letras por fila) y un bytea con un bit por asiento (1 = ocupado). El asiento
+"12C" con columnas "ABCDEF" es el bit (12 - 1) * 6 + 2; dentro de cada byte
+los bits se numeran desde el menos significativo, igual que get_bit/set_bit
+de PostgreSQL.
+
+Reservar o liberar varios asientos es una sola sentencia UPDATE que cambia
+todos los bits a la vez solo si ninguno estaba ya en el estado pedido, y en
+la misma transacción se ajusta el cupo del vuelo. En vuelos con shards los
+bits y el cupo están repartidos por bloques de filas (ver seat_shards) y el
+UPDATE va a cada shard dueño de alguno de los asientos.
+"""
+
+import base64
+import math
+import os
+import re
+
+from sqlalchemy import select, update, func, LargeBinary
+from sqlalchemy.exc import IntegrityError
+
+from models import SeatMap, SeatShard
+from seat_shards import adjust_available_seats, borrow_seats, shard_total, count_bits, join_occupancy
+
+SEAT_COLUMNS = os.getenv("SEAT_COLUMNS", "ABCDEF")
+SEAT_PATTERN = re.compile(r"^(\d+)([A-Z])$")
+
+
+class InvalidSeatError(Exception):
+    """El asiento no existe en la distribución del vuelo"""
+
+
+class SeatUnavailableError(Exception):
+    """Algún asiento ya estaba en el estado pedido o no quedan cupos"""
+
+
+def new_seat_map(flight, seat_columns: str = SEAT_COLUMNS):
+    rows = math.ceil(flight.total_seats / len(seat_columns))
+    return SeatMap(
+        flight_id=flight.id,
+        rows=rows,
+        seat_columns=seat_columns,
+        occupancy=bytes(math.ceil(rows * len(seat_columns) / 8)),
+    )
+
+
+def get_or_create_seat_map(db, flight):
+    seat_map = db.get(SeatMap, flight.id)
+    if seat_map is not None:
+        return seat_map
+
+    # Vuelos creados antes de existir los mapas: se crea al primer uso
+    seat_map = new_seat_map(flight)
+    db.add(seat_map)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        seat_map = db.get(SeatMap, flight.id)
+    return seat_map
+
+
+def seat_bit(seat_map, total_seats: int, seat: str) -> int:
+    match = SEAT_PATTERN.match(seat.strip().upper())
+    if not match:
+        raise InvalidSeatError(f"Asiento inválido: {seat}")
+    row, letter = int(match.group(1)), match.group(2)
+    if not 1 <= row <= seat_map.rows or letter not in seat_map.seat_columns:
+        raise InvalidSeatError(f"Asiento inválido: {seat}")
+    bit = (row - 1) * len(seat_map.seat_columns) + seat_map.seat_columns.index(letter)
+    # La última fila puede estar incompleta
+    if bit >= total_seats:
+        raise InvalidSeatError(f"Asiento inválido: {seat}")
+    return bit
+
+
+def is_occupied(occupancy: bytes, bit: int) -> bool:
+    return bool(occupancy[bit // 8] >> (bit % 8) & 1)
+
+
+def seat_map_occupancy(db, seat_map):
+    """Bitmap completo del vuelo; con shards se arma a partir de sus bloques"""
+    if not seat_map.shards:
+        return seat_map.occupancy
+    segments = db.execute(
+        select(SeatShard.first_row, SeatShard.occupancy).where(SeatShard.flight_id == seat_map.flight_id)
+    ).all()
+    if not segments:
+        # Se desactivaron los shards entre las dos lecturas: el mapa volvió a su fila
+        db.refresh(seat_map)
+        return seat_map.occupancy
+    return join_occupancy(len(seat_map.occupancy), segments, len(seat_map.seat_columns))
+
+
+def seat_map_payload(seat_map, flight, occupancy: bytes):
+    return {
+        "flight_id": flight.id,
+        "rows": seat_map.rows,
+        "seat_columns": seat_map.seat_columns,
+        "total_seats": flight.total_seats,
+        "occupied_seats": count_bits(occupancy),
+        "bit_order": "lsb",
+        "occupancy": base64.b64encode(occupancy).decode(),
+    }
+
+
+def flip_bits(column, bits, occupy: bool):
+    """Nuevo valor de column con los bits cambiados y las condiciones de que estaban al revés"""
+    current = 0 if occupy else 1
+    occupancy = column
+    conditions = []
+    for bit in bits:
+        occupancy = func.set_bit(occupancy, bit, 1 - current, type_=LargeBinary)
+        conditions.append(func.get_bit(column, bit) == current)
+    return occupancy, conditions
+
+
+def change_map_seats(db, flight, bits, occupy: bool):
+    """Sin shards: los bits en la fila del mapa y el cupo en la del vuelo, sin commit"""
+    occupancy, conditions = flip_bits(SeatMap.occupancy, bits, occupy)
+    claimed = db.execute(
+        update(SeatMap)
+        .where(SeatMap.flight_id == flight.id, SeatMap.shards == 0, *conditions)
+        .values(occupancy=occupancy)
+        .returning(SeatMap.flight_id)
+    ).first()
+    if claimed is None:
+        return None
+
+    result = adjust_available_seats(db, flight.id, len(bits) if occupy else -len(bits))
+    if result is None:
+        db.rollback()
+        raise SeatUnavailableError("No hay suficientes asientos disponibles")
+    return result
+
+
+def change_shard_seats(db, flight, seats_per_row, bits, occupy: bool):
+    """Con shards: bits y cupo solo en los shards dueños de los asientos, sin commit"""
+    blocks = db.execute(
+        select(SeatShard.shard, SeatShard.first_row, SeatShard.rows).where(SeatShard.flight_id == flight.id)
+    ).all()
+    if not blocks:
+        return None
+
+    by_shard = {}
+    for bit in bits:
+        row = bit // seats_per_row
+        block = next(block for block in blocks if block.first_row <= row < block.first_row + block.rows)
+        by_shard.setdefault(block.shard, []).append(bit - block.first_row * seats_per_row)
+
+    # En orden de shard: dos reservas que tocan los mismos bloques no se bloquean en cruz
+    missing = 0
+    for shard, shard_bits in sorted(by_shard.items()):
+        available = db.scalar(
+            select(SeatShard.available_seats)
+            .where(SeatShard.flight_id == flight.id, SeatShard.shard == shard)
+            .with_for_update()
+        )
+        if available is None:
+            return None
+        seats = len(shard_bits) if occupy else -len(shard_bits)
+        # Si el bloque se quedó sin cupo (ventas sin asiento) lo que falte sale de otro shard
+        taken = min(available, seats)
+        occupancy, conditions = flip_bits(SeatShard.occupancy, shard_bits, occupy)
+        claimed = db.execute(
+            update(SeatShard)
+            .where(SeatShard.flight_id == flight.id, SeatShard.shard == shard, *conditions)
+            .values(occupancy=occupancy, available_seats=SeatShard.available_seats - taken)
+            .returning(SeatShard.shard)
+        ).first()
+        if claimed is None:
+            return None
+        missing += seats - taken
+
+    # Recién con todos los bloques tomados: pedir prestado nunca espera un lock
+    if missing and not borrow_seats(db, flight.id, missing):
+        db.rollback()
+        raise SeatUnavailableError("No hay suficientes asientos disponibles")
+    return shard_total(db, flight.id)
+
+
+def change_seats(db, flight, seats, occupy: bool):
+    """Ocupa o libera los asientos indicados en una sola transacción
+
+    Devuelve la fila actualizada del vuelo (id, available_seats, origen,
+    destino, salida) o lanza InvalidSeatError / SeatUnavailableError.
+    """
+    seat_map = get_or_create_seat_map(db, flight)
+    bits = sorted({seat_bit(seat_map, flight.total_seats, seat) for seat in seats})
+    if not bits:
+        raise InvalidSeatError("No se indicaron asientos")
+
+    seats_per_row = len(seat_map.seat_columns)
+    sharded = bool(seat_map.shards)
+    while True:
+        if sharded:
+            result = change_shard_seats(db, flight, seats_per_row, bits, occupy)
+        else:
+            result = change_map_seats(db, flight, bits, occupy)
+        if result is not None:
+            db.commit()
+            return result
+        db.rollback()
+
+        # Si entretanto se activaron o desactivaron los shards se reintenta del otro lado
+        now_sharded = bool(db.scalar(select(SeatMap.shards).where(SeatMap.flight_id == flight.id)))
+        if now_sharded == sharded:
+            raise SeatUnavailableError("Alguno de los asientos no está disponible")
+        sharded = now_sharded
@@ -28,6 +28,42 @@ CREATE TABLE IF NOT EXISTS flights (
     CHECK (available_seats <= total_seats)
 );
 
+-- Mapa de asientos por vuelo: un bit por asiento (1 = ocupado)
+CREATE TABLE IF NOT EXISTS flight_seat_maps (
+    flight_id INTEGER PRIMARY KEY REFERENCES flights(id) ON DELETE CASCADE,
+    rows INTEGER NOT NULL,
+    seat_columns VARCHAR(10) NOT NULL,
+    occupancy BYTEA NOT NULL,
+    shards INTEGER NOT NULL DEFAULT 0
+);
+
+-- Mapa y cupo repartidos en bloques de filas para vuelos de alta demanda (opcional por vuelo)
+CREATE TABLE IF NOT EXISTS flight_seat_shards (
+    flight_id INTEGER REFERENCES flights(id) ON DELETE CASCADE,
+    shard INTEGER NOT NULL,
+    first_row INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    occupancy BYTEA NOT NULL,
+    available_seats INTEGER NOT NULL,
+    PRIMARY KEY (flight_id, shard),
+    CHECK (available_seats >= 0)
+);
+
+-- Vuelos que ya salieron: el proceso de archivo los mueve aquí desde flights
+CREATE TABLE IF NOT EXISTS flights_archive (
+    id INTEGER PRIMARY KEY,
+    flight_number VARCHAR(50) NOT NULL,
+    origin VARCHAR(50) NOT NULL,
+    destination VARCHAR(50) NOT NULL,
+    departure_time TIMESTAMP NOT NULL,
+    arrival_time TIMESTAMP NOT NULL,
+    price INTEGER NOT NULL,
+    available_seats INTEGER NOT NULL,
+    total_seats INTEGER NOT NULL,
+    airline_id INTEGER,
+    created_at TIMESTAMP,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 -- Tabla de pagos
 CREATE TABLE IF NOT EXISTS payments (
@@ -42,8 +78,10 @@ CREATE TABLE IF NOT EXISTS payments (
 );
 
 -- Índices para mejorar el rendimiento
-CREATE INDEX idx_flights_origin_destination ON flights(origin, destination);
-CREATE INDEX idx_flights_departure_time ON flights(departure_time);
+CREATE INDEX idx_flights_origin_destination ON flights(origin, destination, departure_time, id);
+CREATE INDEX idx_flights_departure_time ON flights(departure_time, id);
+CREATE INDEX idx_flights_archive_route ON flights_archive(origin, destination, departure_time, id);
+CREATE INDEX idx_flights_archive_departure_time ON flights_archive(departure_time, id);
 CREATE INDEX idx_payments_booking_id ON payments(booking_id);
 CREATE INDEX idx_payments_user_id ON payments(user_id);
 CREATE INDEX idx_users_email ON users(email);
@@ -1,3 +1,9 @@
+import os
+import sys
+
+# Módulos compartidos entre servicios (carpeta common/ en la raíz del repositorio)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
 from fastapi import FastAPI, HTTPException, Depends, status, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -5,7 +11,8 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import List
 from models import Payment, get_db
-import requests
+from common.token_verifier import TokenVerifier, TokenVerificationError, KeyUnavailableError
+from common.service_client import ServiceClient
 import uuid
 import uvicorn
 
@@ -19,7 +26,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-AUTH_SERVICE_URL = "http://localhost:8001"
+AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://localhost:8001")
+INTERNAL_SERVICE_TOKEN = os.getenv("INTERNAL_SERVICE_TOKEN", "")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Llamadas a otros servicios: pool keep-alive, plazo total, reintentos y circuit breaker
+service_client = ServiceClient()
+
+# Los tokens se validan localmente con las llaves publicadas por auth-service
+token_verifier = TokenVerifier(AUTH_SERVICE_URL, INTERNAL_SERVICE_TOKEN, TOKEN_CACHE_SIZE, service_client)
 
 # Modelos Pydantic
 class PaymentCreate(BaseModel):
@@ -56,18 +71,15 @@ def verify_token(authorization: str = Header(None)):
             detail="Token no proporcionado"
         )
     
+    token = authorization.replace("Bearer ", "")
     try:
-        token = authorization.replace("Bearer ", "")
-        response = requests.get(f"{AUTH_SERVICE_URL}/auth/verify", params={"token": token})
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido"
-            )
-        
-        return response.json()
-    except requests.RequestException:
+        return token_verifier.verify(token)
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+    except KeyUnavailableError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Servicio de autenticación no disponible"
@@ -93,6 +105,13 @@ def root():
         "status": "running"
     }
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "token_cache": token_verifier.cache.stats(),
+        "downstream": service_client.stats()
+    }
+
 @app.post("/payments/process", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
 def process_payment(
     payment_data: PaymentCreate,